@@ -1,49 +1,151 @@
 #!/usr/bin/env python
 
 import asyncio
+import logging
 import os
+import queue
+import sys
+import time
 import websockets
 import json
 
-from typing import List
-from bot import Bot
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+from bot import Bot, PLANNER_GRACE, get_tick_fallback_actions
 from bot_message import BotMessage, MessageType
 from game_message import Tick, Team
+from my_lib.profiler import profiler
+from my_lib.recording import RECORD_PATH_ENV, TickRecorder
+
+logger = logging.getLogger("bot")
+
+
+def setup_logging() -> QueueListener:
+    """
+    Log records are only put in a queue by the event loop and the planning thread; a listener thread writes them out,
+    so a slow stdout never delays a command.
+    """
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
 
 
 async def run():
     uri = "ws://127.0.0.1:8765"
 
     async with websockets.connect(uri) as websocket:
-        bot = Bot()
+        bot = Bot(parallel_workers=int(os.environ.get("PARALLEL_WORKERS", "0")))
         if "TOKEN" in os.environ:
             await websocket.send(json.dumps({"type": "REGISTER", "token": os.environ["TOKEN"]}))
         else:
             await websocket.send(json.dumps({"type": "REGISTER", "teamName": "MyPythonicBot"}))
 
-        await game_loop(websocket=websocket, bot=bot)
+        round_trip = await measure_latency(websocket)
+        if round_trip is not None:
+            logger.info(f"Measured network round trip : {round_trip * 1000:.1f} ms")
+            bot.set_network_latency(round_trip)
+
+        recorder = TickRecorder(os.environ[RECORD_PATH_ENV]) if os.environ.get(RECORD_PATH_ENV) else None
+        try:
+            await game_loop(websocket=websocket, bot=bot, recorder=recorder)
+        finally:
+            bot.close()
+            if recorder:
+                recorder.close()
 
 
-async def game_loop(websocket: websockets.WebSocketServerProtocol, bot: Bot):
-    while True:
+async def measure_latency(websocket: websockets.WebSocketClientProtocol, samples: int = 3) -> Optional[float]:
+    """Round trip to the server in seconds, the best of a few pings."""
+    best_round_trip = None
+    for _ in range(samples):
+        start = time.monotonic()
         try:
-            message = await websocket.recv()
-        except websockets.exceptions.ConnectionClosed:
-            # Connection is closed, the game is probably over
-            print("Websocket was closed.")
+            pong_waiter = await websocket.ping()
+            await asyncio.wait_for(pong_waiter, timeout=1)
+        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
             break
+        round_trip = time.monotonic() - start
+        best_round_trip = round_trip if best_round_trip is None else min(best_round_trip, round_trip)
+    return best_round_trip
+
+
+def decode_message(message: str) -> Tick:
+    return Tick.decode(json.loads(message))
+
+
+async def game_loop(websocket: websockets.WebSocketServerProtocol, bot: Bot, recorder: Optional[TickRecorder] = None):
+    """
+    Decoding and planning run on a single worker thread so the event loop keeps answering keepalives while the bot
+    thinks. The planning deadline is counted from the moment the message was received, and the command is sent as
+    soon as the planner returns. A planner still running PLANNER_GRACE after its deadline is not waited for: the
+    fallback actions of the tick are sent instead, and the next tick is decoded once the planner is done with this one.
+    The raw message is then given to the recorder, on the same thread, once the command is sent.
+    """
+    loop = asyncio.get_event_loop()
+    latencies: List[float] = []
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="planner") as executor:
+        while True:
+            try:
+                message = await websocket.recv()
+            except websockets.exceptions.ConnectionClosed:
+                # Connection is closed, the game is probably over
+                logger.info("Websocket was closed.")
+                break
+            received_at = time.monotonic()
+
+            with profiler.phase("loop.decode"):
+                game_message: Tick = await loop.run_in_executor(executor, decode_message, message)
+            logger.info(f"Playing tick {game_message.tick} of {game_message.totalTick}")
+
+            my_team: Team = game_message.get_teams_by_id()[game_message.teamId]
+
+            if my_team.errors:
+                logger.info(f"Bot command errors :  {' '.join(my_team.errors)}")
 
-        game_message: Tick = Tick.from_dict(json.loads(message))
-        print(f"Playing tick {game_message.tick} of {game_message.totalTick}")
+            deadline = received_at + bot.time_budget
+            with profiler.phase("loop.plan"):
+                planning = loop.run_in_executor(executor, bot.get_next_moves, game_message, deadline)
+                try:
+                    next_moves: List = await asyncio.wait_for(
+                        planning, timeout=max(0.0, deadline + PLANNER_GRACE - time.monotonic()))
+                except asyncio.TimeoutError:
+                    # le thread du planner ne peut pas être interrompu, il finit ce tick avant le décodage du suivant
+                    logger.warning(f"Planning of tick {game_message.tick} missed its deadline, sending fallback actions")
+                    profiler.count("loop.plan_timeouts")
+                    next_moves = get_tick_fallback_actions(game_message)
+            with profiler.phase("loop.encode"):
+                command = BotMessage(type=MessageType.COMMAND, actions=next_moves, tick=game_message.tick).encode()
+            with profiler.phase("loop.send"):
+                await websocket.send(command)
+            if recorder:
+                executor.submit(recorder.write, message)
+            latencies.append(time.monotonic() - received_at)
+            profiler.record_duration("loop.receive_to_send", latencies[-1])
+            profiler.end_tick()
+            logger.debug(f"Tick {game_message.tick} answered in {latencies[-1] * 1000:.1f} ms")
 
-        my_team: Team = game_message.get_teams_by_id()[game_message.teamId]
+    log_latency_summary(latencies)
+    profiler.dump()
 
-        if my_team.errors:
-            print(f"Bot command errors :  {' '.join(my_team.errors)}")
 
-        next_moves: List = bot.get_next_moves(game_message)
-        await websocket.send(BotMessage(type=MessageType.COMMAND, actions=next_moves, tick=game_message.tick).to_json())
+def log_latency_summary(latencies: List[float]):
+    """Receive to send latency over the game, in ms."""
+    if not latencies:
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    logger.info(f"Answered {len(ordered)} ticks, receive to send latency : mean {sum(ordered) / len(ordered) * 1000:.1f} ms,"
+                f" p95 {p95 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms")
 
 
 if __name__ == "__main__":
-    asyncio.get_event_loop().run_until_complete(run())
+    log_listener = setup_logging()
+    try:
+        asyncio.get_event_loop().run_until_complete(run())
+    finally:
+        log_listener.stop()
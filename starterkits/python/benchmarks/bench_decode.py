@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Compares Tick.from_dict (dataclasses_json) with Tick.decode on recorded ticks.
+
+Usage, from starterkits/python: python -m benchmarks.bench_decode <recording.jsonl[.gz]> [repeat]
+A recording has one raw tick message per line.
+"""
+
+import json
+import sys
+import time
+from typing import List
+
+from game_message import Tick
+from my_lib.recording import read_messages
+
+
+def time_decoder(decoder, payloads: List[dict], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            decoder(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    payloads = [json.loads(message) for message in read_messages(sys.argv[1])]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for payload in payloads:
+        if repr(Tick.from_dict(payload)) != repr(Tick.decode(payload)):
+            print(f"Tick {payload['tick']} decodes differently")
+            sys.exit(1)
+
+    reference = time_decoder(Tick.from_dict, payloads, repeat)
+    fast = time_decoder(Tick.decode, payloads, repeat)
+    print(f"{len(payloads)} ticks, best of {repeat}")
+    print(f"Tick.from_dict : {reference * 1000 / len(payloads):8.3f} ms/tick")
+    print(f"Tick.decode    : {fast * 1000 / len(payloads):8.3f} ms/tick ({reference / fast:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Checks that BotMessage.encode gives the expected bytes, with and without orjson, then compares its speed with
+BotMessage.to_json.
+
+Usage, from starterkits/python: python -m benchmarks.bench_encode [actions] [repeat]
+"""
+
+import json
+import random
+import sys
+import time
+from typing import Callable, List
+
+from bot_message import BotMessage, MessageType, orjson
+from game_command import CommandAction, CommandType
+from game_message import Position
+
+GOLDEN = [
+    (BotMessage(type=MessageType.COMMAND, actions=[], tick=0),
+     '{"type":"COMMAND","actions":[],"tick":0}'),
+    (BotMessage(type=MessageType.COMMAND, actions=[
+        CommandAction(action=CommandType.MOVE, unitId="1", target=Position(3, 14)),
+        CommandAction(action=CommandType.NONE, unitId="2", target=None),
+        CommandAction(action=CommandType.SPAWN, unitId="3", target=Position(0, 0)),
+    ], tick=42),
+     '{"type":"COMMAND","actions":[{"action":"MOVE","unitId":"1","target":{"x":3,"y":14},"type":"UNIT"},'
+     '{"action":"NONE","unitId":"2","type":"UNIT"},'
+     '{"action":"SPAWN","unitId":"3","target":{"x":0,"y":0},"type":"UNIT"}],"tick":42}'),
+    (BotMessage(type=MessageType.COMMAND, actions=[CommandAction(action=CommandType.DROP, unitId='u"\\é',
+                                                                 target=Position(-1, 7))], tick=None),
+     '{"type":"COMMAND","actions":[{"action":"DROP","unitId":"u\\"\\\\é","target":{"x":-1,"y":7},"type":"UNIT"}],'
+     '"tick":null}'),
+    (BotMessage(type=MessageType.REGISTER),
+     '{"type":"REGISTER","actions":null,"tick":null}'),
+]
+
+
+def reference_encode(message: BotMessage) -> str:
+    """to_json's content without the null targets, in the compact form."""
+    data = message.to_dict(encode_json=True)
+    for action in data["actions"] or []:
+        if action["target"] is None:
+            del action["target"]
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def random_message(actions: int, rng: random.Random) -> BotMessage:
+    command_types = list(CommandType)
+    return BotMessage(type=MessageType.COMMAND, tick=rng.randint(0, 1000), actions=[
+        CommandAction(action=rng.choice(command_types), unitId=str(index),
+                      target=Position(rng.randint(0, 200), rng.randint(0, 200)) if rng.random() < 0.8 else None)
+        for index in range(actions)])
+
+
+def get_encoders() -> List[tuple]:
+    encoders = [("to_json", BotMessage.to_json), ("encode", lambda message: message.encode(use_orjson=False))]
+    if orjson is not None:
+        encoders.append(("encode (orjson)", lambda message: message.encode(use_orjson=True)))
+    return encoders
+
+
+def check_golden(messages: List[BotMessage]) -> bool:
+    valid = True
+    cases = [(message, expected) for message, expected in GOLDEN]
+    cases += [(message, reference_encode(message)) for message in messages]
+    for name, encoder in get_encoders()[1:]:
+        for message, expected in cases:
+            if encoder(message) != expected:
+                print(f"{name} differs for tick {message.tick} :\n  {encoder(message)}\n  {expected}")
+                valid = False
+    return valid
+
+
+def time_encoder(encoder: Callable, messages: List[BotMessage], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            encoder(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(messages)
+
+
+def main():
+    actions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(0)
+    messages = [random_message(actions, rng) for _ in range(200)]
+
+    if not check_golden(messages):
+        sys.exit(1)
+    print(f"Golden outputs match, {len(messages)} messages of {actions} actions, best of {repeat}")
+    reference = None
+    for name, encoder in get_encoders():
+        elapsed = time_encoder(encoder, messages, repeat)
+        reference = reference or elapsed
+        print(f"{name:<16}: {elapsed * 1000:8.3f} ms/message ({reference / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
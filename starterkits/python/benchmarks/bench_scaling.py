@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Times the main components of the bot on synthetic maps, sweeping one scenario parameter at a time.
+
+Usage, from starterkits/python: python -m benchmarks.bench_scaling [size ...]
+Every row gives the mean time per call and the peak memory allocated during the calls (tracemalloc, measured in a
+separate run since it slows everything down).
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import replace
+from typing import Callable, List, Tuple
+
+from benchmarks.scenarios import ScenarioConfig, generate_tick
+from bot import Bot
+from my_lib.compiled_map import CompiledMap, EMPTY
+from my_lib.map_analysis import MapAnalysis
+from my_lib.pathfinder_manager import OCCUPIED_BY_ALLY
+from my_lib.search import astar
+
+SAMPLES = 20
+
+
+def measure(function: Callable[[], int]) -> Tuple[float, int]:
+    """Mean seconds per call and peak allocated bytes, function returning the number of calls it made."""
+    start = time.perf_counter()
+    calls = function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / max(1, calls), peak
+
+
+def benchmark_scenario(config: ScenarioConfig) -> List[Tuple[str, float, int]]:
+    tick = generate_tick(config)
+    rng = random.Random(config.seed)
+
+    def full_tick():
+        Bot().get_next_moves(tick, deadline=float("inf"))
+        return 1
+
+    rows = [("tick (cold)", *measure(full_tick))]
+
+    bot = Bot()
+    bot.get_next_moves(tick, deadline=float("inf"))
+    compiled_map = bot.compiled_map
+    pathfinder = bot.pathfinder
+    rows.append(("compiled map", *measure(lambda: CompiledMap(tick.map) and 1)))
+    rows.append(("map analysis", *measure(lambda: MapAnalysis(compiled_map) and 1)))
+
+    empty_positions = [compiled_map.position_of(index) for index in range(compiled_map.size)
+                       if compiled_map.tiles[index] == EMPTY]
+    pairs = [(rng.choice(empty_positions), rng.choice(empty_positions)) for _ in range(SAMPLES)]
+
+    def astar_calls():
+        for start, end in pairs:
+            astar(compiled_map, start, end, pathfinder.get_occupancy(), OCCUPIED_BY_ALLY)
+        return len(pairs)
+
+    rows.append(("astar", *measure(astar_calls)))
+
+    targets = bot.target_manager.get_diamond_targets()[:SAMPLES]
+
+    def optimal_spawns():
+        for target in targets:
+            pathfinder.find_optimal_spawn([target])
+        return len(targets)
+
+    rows.append(("find_optimal_spawn", *measure(optimal_spawns)))
+
+    units = [unit for unit in bot.unit_manager.get_allied_units() if unit.hasSpawned]
+
+    def prioritized_targets():
+        # champs de distance froids, comme au premier tick ou après l'apparition de diamants
+        pathfinder.distance_fields.clear()
+        for unit in units:
+            bot.target_manager.get_prioritized_target_list(unit)
+        return len(units)
+
+    rows.append(("prioritized targets (cold)", *measure(prioritized_targets)))
+    return rows
+
+
+def get_sweeps(sizes: List[int]) -> List[ScenarioConfig]:
+    base = ScenarioConfig(size=100, diamonds=20)
+    scenarios = [replace(base, size=size, diamonds=max(4, size // 5)) for size in sizes]
+    scenarios += [replace(base, wall_density=density) for density in (0.1, 0.4)]
+    scenarios += [replace(base, spawn_layout=layout) for layout in ("border", "scattered")]
+    scenarios += [replace(base, teams=2, units_per_team=10), replace(base, diamonds=80)]
+    return scenarios
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [50, 100, 150, 200]
+    for config in get_sweeps(sizes):
+        print(config.label())
+        for name, seconds, peak in benchmark_scenario(config):
+            print(f"    {name:<28} {seconds * 1000:9.3f} ms {peak / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Replays a recorded game through Bot.get_next_moves, without a socket.
+
+Usage, from starterkits/python: python -m benchmarks.replay <recording.jsonl[.gz]> [seed]
+A recording is written by application.py when BOT_RECORD is set, one raw tick message per line.
+
+The first replay plays like game_loop (decode, plan until the deadline, encode) and reports the per tick latency.
+Two more replays are then run with the given seed and no deadline, and must give the same actions.
+"""
+
+import json
+import random
+import sys
+import time
+from typing import List
+
+from bot import Bot, TICK_DURATION
+from bot_message import BotMessage, MessageType
+from game_message import Tick
+from my_lib.recording import read_messages
+
+PERCENTILES = (50, 90, 99, 100)
+
+
+def replay_latencies(messages: List[str], bot: Bot) -> List[float]:
+    """Receive to encoded command time of every tick, in seconds."""
+    latencies = []
+    for message in messages:
+        received_at = time.monotonic()
+        tick = Tick.decode(json.loads(message))
+        actions = bot.get_next_moves(tick, deadline=received_at + bot.time_budget)
+        BotMessage(type=MessageType.COMMAND, actions=actions, tick=tick.tick).encode()
+        latencies.append(time.monotonic() - received_at)
+    return latencies
+
+
+def replay_actions(messages: List[str], seed: int) -> List[str]:
+    random.seed(seed)
+    bot = Bot()
+    return [repr(bot.get_next_moves(Tick.decode(json.loads(message)), deadline=float("inf"))) for message in messages]
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, round(len(ordered) * percent / 100) - 1))]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    messages = read_messages(sys.argv[1])
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    bot = Bot()
+    latencies = replay_latencies(messages, bot)
+    ordered = sorted(latencies)
+    print(f"{len(messages)} ticks, time budget {bot.time_budget * 1000:.0f} ms")
+    print("latency : " + ", ".join(f"p{percent} {percentile(ordered, percent) * 1000:.1f} ms"
+                                   for percent in PERCENTILES))
+    print(f"over budget : {sum(latency > bot.time_budget for latency in latencies)}, "
+          f"timeouts : {sum(latency > TICK_DURATION for latency in latencies)}")
+
+    first = replay_actions(messages, seed)
+    second = replay_actions(messages, seed)
+    for index, (first_actions, second_actions) in enumerate(zip(first, second)):
+        if first_actions != second_actions:
+            print(f"Not deterministic with seed {seed} : tick {index} differs")
+            sys.exit(1)
+    print(f"Deterministic with seed {seed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Synthetic game states for the benchmarks: a ScenarioConfig gives a reproducible Tick of any size, decoded by
+Tick.decode from the same kind of payload the server sends.
+"""
+
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from game_message import Tick
+
+SPAWN_LAYOUTS = ("sides", "border", "scattered")
+
+
+@dataclass
+class ScenarioConfig:
+    size: int = 60
+    wall_density: float = 0.25
+    spawn_layout: str = "sides"  # colonnes de gauche et de droite, tout le contour, ou tuiles au hasard
+    scattered_spawns: int = 20
+    teams: int = 4
+    units_per_team: int = 4
+    spawned_ratio: float = 0.7
+    diamonds: int = 12
+    tick: int = 5
+    total_ticks: int = 100
+    seed: int = 1
+
+    def label(self) -> str:
+        return (f"{self.size}x{self.size} walls={self.wall_density:.2f} {self.spawn_layout} "
+                f"{self.teams}x{self.units_per_team} units {self.diamonds} diamonds")
+
+
+def generate_tiles(config: ScenarioConfig, rng: random.Random) -> List[List[str]]:
+    if config.spawn_layout not in SPAWN_LAYOUTS:
+        raise ValueError(f"Unknown spawn layout '{config.spawn_layout}', expected one of {SPAWN_LAYOUTS}")
+    size = config.size
+    tiles = [["WALL" if rng.random() < config.wall_density else "EMPTY" for _ in range(size)] for _ in range(size)]
+    if config.spawn_layout == "scattered":
+        spawns = rng.sample([(x, y) for x in range(size) for y in range(size)], min(config.scattered_spawns, size * size))
+    else:
+        spawns = [(x, y) for x in (0, size - 1) for y in range(size)]
+        if config.spawn_layout == "border":
+            spawns += [(x, y) for x in range(1, size - 1) for y in (0, size - 1)]
+    for x, y in spawns:
+        tiles[x][y] = "SPAWN"
+    return tiles
+
+
+def generate_payload(config: ScenarioConfig) -> dict:
+    """Tick message as the server would send it, units and diamonds being placed on distinct empty tiles."""
+    rng = random.Random(config.seed)
+    tiles = generate_tiles(config, rng)
+    empty_tiles: List[Tuple[int, int]] = [(x, y) for x in range(config.size) for y in range(config.size)
+                                          if tiles[x][y] == "EMPTY"]
+    if len(empty_tiles) < config.diamonds + config.teams * config.units_per_team:
+        raise ValueError(f"Not enough empty tiles for {config.label()}")
+    rng.shuffle(empty_tiles)
+
+    diamonds = [{"id": f"d{index}", "position": dict(zip("xy", empty_tiles.pop())), "summonLevel": rng.randint(1, 5),
+                 "points": rng.randint(1, 10), "ownerId": None} for index in range(config.diamonds)]
+
+    teams = []
+    for team_index in range(config.teams):
+        team_id = f"team{team_index}"
+        units = []
+        for unit_index in range(config.units_per_team):
+            has_spawned = rng.random() < config.spawned_ratio
+            # les identifiants du serveur sont des entiers, uniques pour toute la partie
+            units.append({"id": str(team_index * config.units_per_team + unit_index), "teamId": team_id, "path": [], "hasDiamond": False,
+                          "hasSpawned": has_spawned, "isSummoning": False, "lastState": {}, "diamondId": None,
+                          "position": dict(zip("xy", empty_tiles.pop())) if has_spawned else None})
+        teams.append({"id": team_id, "name": team_id, "score": 0, "units": units, "errors": []})
+
+    team_ids = [team["id"] for team in teams]
+    play_orderings = {}
+    for tick in range(config.total_ticks + 2):
+        ordering = team_ids[:]
+        rng.shuffle(ordering)
+        play_orderings[str(tick)] = ordering
+
+    return {"tick": config.tick, "totalTick": config.total_ticks, "teamId": team_ids[0], "teams": teams,
+            "map": {"tiles": tiles, "diamonds": diamonds},
+            "gameConfig": {"pointsPerDiamond": 1, "maximumDiamondSummonLevel": 5, "initialDiamondSummonLevel": 1},
+            "teamPlayOrderings": play_orderings}
+
+
+def generate_tick(config: ScenarioConfig) -> Tick:
+    return Tick.decode(generate_payload(config))
@@ -1,20 +1,56 @@
-import threading
+import logging
+import random
+import time
 from typing import List, Optional
 
-from game_command import CommandAction
-from game_message import Tick, Team, Position, TileType
+from game_command import CommandAction, CommandType
+from game_message import Position, Tick, Team
 from my_lib.action_manager import ActionManager
+from my_lib.compiled_map import CompiledMap
+from my_lib.line_of_sight import LineOfSight
+from my_lib.map_analysis import MapAnalysis
+from my_lib.models import PrioritizedUnit
+from my_lib.parallel_search import ParallelSearchPool
 from my_lib.pathfinder_manager import PathFinderManager
+from my_lib.profiler import profiler
 from my_lib.spawn_manager import SpawnManager
 from my_lib.target_manager import TargetManager
+from my_lib.tick_ingestor import TickIngestor
 from my_lib.unit_manager import UnitManager
 
+TICK_DURATION = 1.0
+DEFAULT_TIME_BUDGET = 0.90
+MIN_TIME_BUDGET = 0.20
+# marge pour les variations du réseau, en plus du round trip mesuré
+NETWORK_MARGIN = 0.05
+# temps pendant lequel un planner en retard sur sa deadline est encore attendu avant d'envoyer les actions de repli
+PLANNER_GRACE = 0.03
+# part du temps restant avant la deadline laissée aux workers, puis à l'assignation globale, le reste va au planning
+PARALLEL_BUDGET_SHARE = 0.4
+ASSIGNMENT_BUDGET_SHARE = 0.5
+
+logger = logging.getLogger("bot")
+
 
 class Bot:
-    def __init__(self):
+    def __init__(self, time_budget: float = DEFAULT_TIME_BUDGET, parallel_workers: int = 0):
+        """
+        parallel_workers > 0 computes the distance fields used to score diamonds in that many worker processes,
+        started here so that no tick waits for them.
+        """
         self.tick: Optional[Tick] = None
+        self.time_budget = time_budget
+        self.parallel_search = None
+        if parallel_workers > 0:
+            try:
+                self.parallel_search = ParallelSearchPool(parallel_workers)
+            except Exception as e:
+                logger.warning(f"Could not start the search workers, searching serially: {e!r}")
         self.team: Optional[Team] = None
         self.corners = None
+        self.compiled_map: Optional[CompiledMap] = None
+        self.map_analysis: Optional[MapAnalysis] = None
+        self.ingestor = TickIngestor()
         self.unit_manager = UnitManager()
         self.spawn_manager = SpawnManager()
         self.pathfinder = PathFinderManager(self.unit_manager, self.spawn_manager)
@@ -22,78 +58,140 @@ class Bot:
         self.action_manager = ActionManager(self.unit_manager, self.pathfinder, self.spawn_manager, self.target_manager)
         print("Initializing your super mega duper bot")
 
-    def get_next_moves(self, tick: Tick) -> List:
+    def set_network_latency(self, round_trip: float):
+        """
+        Keeps enough of each tick for the tick to reach us and the command to reach the server, round_trip being the
+        ping round trip in seconds, plus NETWORK_MARGIN of slack and PLANNER_GRACE for a planner late on its deadline.
+        """
+        self.time_budget = max(MIN_TIME_BUDGET, TICK_DURATION - round_trip - NETWORK_MARGIN - PLANNER_GRACE)
+
+    def get_next_moves(self, tick: Tick, deadline: Optional[float] = None) -> List:
         """
         Here is where the magic happens, for now the moves are random. I bet you can do better ;)
 
         No path finding is required, you can simply send a destination per unit and the game will move your unit towards
         it in the next turns.
+
+        Planning stops at deadline (a time.monotonic() value, time_budget from now by default) and every allied unit
+        still gets a command.
         """
+        if deadline is None:
+            deadline = time.monotonic() + self.time_budget
         self.tick = tick
-        if tick.tick == 0:
-            self.corners = self.find_corners()
-            self.spawn_manager.init_tick(tick)
-        self.unit_manager.init_tick(tick)
-        self.target_manager.init_tick(tick)
-        self.pathfinder.set_tick_map(tick.map)
-        self.action_manager.init_tick(tick)
-
-        actions: List[CommandAction] = []
-        thread = threading.Thread(target=run_action, args=(self.action_manager, actions, self.corners))
-        thread.start()
-        thread.join(timeout=0.90)
-
-        return actions
-
-    def find_corners(self):
-        game_map = self.tick.map.tiles
-        corners = []
-        for x in range(len(game_map)):
-            for y in range(len(game_map[x])):
-                gauche = 0
-                droite = 0
-                bas = 0
-                haut = 0
-                if self.tick.map.get_tile_type_at(Position(x, y)) == TileType.EMPTY:
-                    try:
-                        if self.tick.map.get_tile_type_at(Position(x - 1, y)) == TileType.EMPTY:
-                            gauche += 1
-                    except:
-                        pass
-
-                    try:
-                        if self.tick.map.get_tile_type_at(Position(x, y - 1)) == TileType.EMPTY:
-                            bas += 1
-                    except:
-                        pass
-
-                    try:
-                        if self.tick.map.get_tile_type_at(Position(x + 1, y)) == TileType.EMPTY:
-                            droite += 1
-                    except:
-                        pass
-
-                    try:
-                        if self.tick.map.get_tile_type_at(Position(x, y + 1)) == TileType.EMPTY:
-                            haut += 1
-                    except:
-                        pass
-                    if (haut+bas == 1 and gauche+droite == 1):
-                        if (haut == 1 and gauche == 1):
-                            corners.append((Position(x, y),Position(0, 0)))
-                        if (haut == 1 and droite == 1):
-                            corners.append((Position(x, y),Position(0, 0)))
-                        if (bas == 1 and gauche == 1):
-                            corners.append((Position(x, y),Position(0, 0)))
-                        if (bas == 1 and droite == 1):
-                            corners.append((Position(x, y),Position(0, 0)))
-        return corners
-
-
-def run_action(action_manager: ActionManager, actions: List[CommandAction], corners):
-    for unit in action_manager.unit_manager.get_allied_units():
-        if not unit.hasSpawned:
-            spawn = action_manager.get_optimal_spawn(unit)
-            actions.append(spawn)
-        else:
-            actions.append(action_manager.get_optimal_move(unit, corners))
+        with profiler.phase("bot.ingest"):
+            delta = self.ingestor.ingest(tick)
+        if delta.map_changed:
+            with profiler.phase("bot.compile_map"):
+                self.compiled_map = CompiledMap(tick.map)
+                self.pathfinder.set_compiled_map(self.compiled_map)
+                self.action_manager.set_line_of_sight(LineOfSight(self.compiled_map))
+                self.map_analysis = MapAnalysis(self.compiled_map)
+                self.corners = self.map_analysis.corners
+                self.spawn_manager.init_tick(tick, self.map_analysis)
+                if self.parallel_search:
+                    self.parallel_search.set_compiled_map(self.compiled_map)
+        with profiler.phase("bot.unit_manager"):
+            self.unit_manager.init_tick(tick)
+        with profiler.phase("bot.target_manager"):
+            self.target_manager.init_tick(tick, delta)
+        with profiler.phase("bot.pathfinder"):
+            self.pathfinder.set_tick_map(tick.map, delta)
+        with profiler.phase("bot.action_manager"):
+            self.action_manager.init_tick(tick, delta)
+
+        if self.parallel_search:
+            with profiler.phase("bot.parallel_search"):
+                try:
+                    now = time.monotonic()
+                    self.run_parallel_searches(now + max(0.0, deadline - now) * PARALLEL_BUDGET_SHARE)
+                except Exception as e:
+                    # BrokenProcessPool entre autres : les champs sont calculés en série pour le reste de la partie
+                    logger.warning(f"Parallel searches failed, searching serially: {e!r}")
+                    self.parallel_search.shutdown()
+        with profiler.phase("bot.assignment"):
+            try:
+                now = time.monotonic()
+                self.target_manager.assign_targets(now + max(0.0, deadline - now) * ASSIGNMENT_BUDGET_SHARE)
+            except Exception as e:
+                # les unités sans diamant assigné gardent le choix glouton de run_action
+                logger.warning(f"Global target assignment failed: {e!r}")
+        with profiler.phase("bot.plan"):
+            return run_action(self.action_manager, self.corners, deadline)
+
+    def run_parallel_searches(self, deadline: float):
+        """
+        Computes in the worker processes the distance fields still missing to score every diamond from the tiles of
+        the free units, in the order assign_targets reads them. Fields not back by deadline are computed serially.
+        """
+        units = [unit for unit in self.unit_manager.get_spawned_allied_units() if not unit.hasDiamond]
+        if not units:
+            return
+        # un champ pour les origines sur une case vide, un autre pour celles sur un spawn
+        from_spawn_values = sorted({not self.compiled_map.is_empty(unit.position) for unit in units})
+        distance_fields = self.pathfinder.distance_fields
+        keys = [(index, from_spawn) for index in (self.compiled_map.index_of(target.position)
+                                                  for target in self.target_manager.get_diamond_targets())
+                for from_spawn in from_spawn_values
+                if index is not None and not distance_fields.has_field(index, from_spawn)]
+        fields = self.parallel_search.compute_distance_fields(keys, deadline)
+        for (index, from_spawn), field in fields.items():
+            distance_fields.add_field(index, from_spawn, field)
+        profiler.count("parallel_distance_fields", len(fields))
+
+    def close(self):
+        if self.parallel_search:
+            self.parallel_search.shutdown()
+
+
+def get_fallback_action(action_manager: ActionManager, unit: PrioritizedUnit) -> CommandAction:
+    if not unit.hasSpawned:
+        return CommandAction(action=CommandType.SPAWN, unitId=unit.id, target=action_manager.get_random_spawn_position())
+    return CommandAction(action=CommandType.NONE, unitId=unit.id, target=None)
+
+
+def get_tick_fallback_actions(tick: Tick) -> List[CommandAction]:
+    """
+    Same actions as get_fallback_action, built from the raw tick only so they can be sent while the planner is still
+    busy with it.
+    """
+    team = tick.get_teams_by_id()[tick.teamId]
+    spawns = None
+    actions = []
+    for unit in team.units:
+        if unit.hasSpawned:
+            actions.append(CommandAction(action=CommandType.NONE, unitId=unit.id, target=None))
+            continue
+        if spawns is None:
+            spawns = [Position(x, y) for x, column in enumerate(tick.map.tiles)
+                      for y, tile in enumerate(column) if tile == "SPAWN"]
+        actions.append(CommandAction(action=CommandType.SPAWN, unitId=unit.id, target=random.choice(spawns)))
+    return actions
+
+
+def get_planning_priority(unit: PrioritizedUnit) -> int:
+    # les porteurs d'abord, puis les unités sur la carte, puis celles à faire apparaître
+    if unit.hasDiamond:
+        return 0
+    return 1 if unit.hasSpawned else 2
+
+
+def run_action(action_manager: ActionManager, corners, deadline: float) -> List[CommandAction]:
+    """
+    Gives every allied unit a cheap fallback action, then refines them in priority order until the deadline.
+    The returned list is a snapshot: nothing keeps planning once it is returned.
+    """
+    units = action_manager.unit_manager.get_allied_units()
+    actions = {unit.id: get_fallback_action(action_manager, unit) for unit in units}
+    for unit in sorted(units, key=get_planning_priority):
+        if time.monotonic() >= deadline:
+            break
+        started_at = time.perf_counter()
+        try:
+            if not unit.hasSpawned:
+                actions[unit.id] = action_manager.get_optimal_spawn(unit)
+            else:
+                actions[unit.id] = action_manager.get_optimal_move(unit, corners)
+        except Exception as e:
+            logger.warning(f"Could not plan unit {unit.id}: {e!r}")
+        profiler.record_duration("bot.unit_decision", time.perf_counter() - started_at)
+    return list(actions.values())
@@ -3,6 +3,11 @@ from dataclasses_json import dataclass_json
 from enum import Enum
 from typing import List
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class MessageType(Enum):
     COMMAND = "COMMAND"
@@ -15,3 +20,19 @@ class BotMessage:
     type: MessageType
     actions: List = None
     tick: int = None
+
+    def to_wire(self) -> dict:
+        return {"type": self.type.value,
+                "actions": [action.to_wire() for action in self.actions] if self.actions is not None else None,
+                "tick": self.tick}
+
+    def encode(self, use_orjson: bool = orjson is not None) -> str:
+        """
+        Compact JSON sent to the server, the same as to_json but without the null targets. Uses orjson when it is
+        installed, the output being identical either way.
+        """
+        if use_orjson:
+            return orjson.dumps(self.to_wire()).decode()
+        actions = "null" if self.actions is None else f"[{','.join(action.encode() for action in self.actions)}]"
+        tick = "null" if self.tick is None else self.tick
+        return f'{{"type":"{self.type.value}","actions":{actions},"tick":{tick}}}'
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from json.encoder import encode_basestring
 from typing import Optional
 from dataclasses_json import dataclass_json
 from enum import Enum
@@ -23,3 +24,18 @@ class CommandAction:
     unitId: str
     target: Position = None
     type: str = "UNIT"
+
+    def to_wire(self) -> dict:
+        """Dict sent to the server, without the target when there is none."""
+        if self.target is None:
+            return {"action": self.action.value, "unitId": self.unitId, "type": self.type}
+        return {"action": self.action.value, "unitId": self.unitId, "target": {"x": self.target.x, "y": self.target.y},
+                "type": self.type}
+
+    def encode(self) -> str:
+        """Compact JSON of to_wire, written directly."""
+        if self.target is None:
+            return (f'{{"action":"{self.action.value}","unitId":{encode_basestring(self.unitId)},'
+                    f'"type":{encode_basestring(self.type)}}}')
+        return (f'{{"action":"{self.action.value}","unitId":{encode_basestring(self.unitId)},'
+                f'"target":{{"x":{self.target.x},"y":{self.target.y}}},"type":{encode_basestring(self.type)}}}')
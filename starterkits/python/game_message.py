@@ -22,13 +22,20 @@ class TileType(Enum):
 
 
 @dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class Position:
+    """Immutable and hashable, so positions can be used in sets and as dict keys."""
+    __slots__ = ("x", "y")
     x: int
     y: int
 
-    def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
+    def __reduce__(self):
+        # frozen avec __slots__ : pickle et deepcopy ne peuvent pas réassigner les champs
+        return Position, (self.x, self.y)
+
+    @staticmethod
+    def decode(data: Optional[dict]) -> Optional[Position]:
+        return Position(data["x"], data["y"]) if data is not None else None
 
 
 @dataclass_json
@@ -67,6 +74,10 @@ class TickMap:
         else:
             raise Exception("Not a valid tile")
 
+    @staticmethod
+    def decode(data: dict) -> TickMap:
+        return TickMap(data["tiles"], [Diamond.decode(diamond) for diamond in data["diamonds"]])
+
 
 @dataclass_json
 @dataclass
@@ -77,6 +88,11 @@ class Diamond:
     points: int
     ownerId: Optional[str] = None
 
+    @staticmethod
+    def decode(data: dict) -> Diamond:
+        return Diamond(data["id"], Position.decode(data["position"]), data["summonLevel"], data["points"],
+                       data.get("ownerId"))
+
 
 @dataclass_json
 @dataclass
@@ -96,7 +112,14 @@ class Unit:
 
     def __eq__(self, other):
         return self.id == other.id
-    
+
+    @staticmethod
+    def decode(data: dict) -> Unit:
+        return Unit(data["id"], data["teamId"], [Position.decode(position) for position in data["path"]],
+                    data["hasDiamond"], data["hasSpawned"], data["isSummoning"],
+                    TickTeamUnitState.decode(data["lastState"]), data.get("diamondId"),
+                    Position.decode(data.get("position")))
+
 
 @dataclass_json
 @dataclass
@@ -105,6 +128,13 @@ class TickTeamUnitState:
     positionBefore: Optional[Position] = None
     wasAttackedBy: Optional[str] = None
 
+    @staticmethod
+    def decode(data: Optional[dict]) -> Optional[TickTeamUnitState]:
+        if data is None:
+            return None
+        return TickTeamUnitState(data.get("wasVinedBy"), Position.decode(data.get("positionBefore")),
+                                 data.get("wasAttackedBy"))
+
 
 @dataclass_json
 @dataclass
@@ -121,6 +151,11 @@ class Team:
     units: List[Unit]
     errors: List[str]
 
+    @staticmethod
+    def decode(data: dict) -> Team:
+        return Team(data["id"], data["name"], data["score"], [Unit.decode(unit) for unit in data["units"]],
+                    data["errors"])
+
 @dataclass_json
 @dataclass
 class GameConfig:
@@ -128,6 +163,11 @@ class GameConfig:
     maximumDiamondSummonLevel: int
     initialDiamondSummonLevel: int
 
+    @staticmethod
+    def decode(data: dict) -> GameConfig:
+        return GameConfig(data["pointsPerDiamond"], data["maximumDiamondSummonLevel"],
+                          data["initialDiamondSummonLevel"])
+
 
 @dataclass_json
 @dataclass
@@ -142,3 +182,12 @@ class Tick:
 
     def get_teams_by_id(self) -> Dict[str, Team]:
         return {team.id: team for team in self.teams}
+
+    @staticmethod
+    def decode(data: dict) -> Tick:
+        """
+        Same result as Tick.from_dict, built with direct constructor calls instead of going through
+        dataclasses_json's reflection. The tiles are used as is, without being copied.
+        """
+        return Tick(data["tick"], data["totalTick"], data["teamId"], [Team.decode(team) for team in data["teams"]],
+                    TickMap.decode(data["map"]), GameConfig.decode(data["gameConfig"]), data["teamPlayOrderings"])
@@ -1,14 +1,20 @@
 import random
-from typing import List
+from typing import List, Optional, Set
 
 from game_command import CommandAction, CommandType
-from game_message import Unit, Tick, Position, TileType
+from game_message import Unit, Tick, Position
+from my_lib.line_of_sight import LineOfSight, NO_SEGMENT
 from my_lib.models import TargetType, Target, PrioritizedUnit
-from my_lib.pathfinder_manager import PathFinderManager
+from my_lib.pathfinder_manager import PathFinderManager, OCCUPIED_BY_ALLY
+from my_lib.play_order import PlayOrderTable
 from my_lib.spawn_manager import SpawnManager
 from my_lib.target_manager import TargetManager
+from my_lib.threat_map import ThreatMap
+from my_lib.tick_ingestor import TickDelta
 from my_lib.unit_manager import UnitManager
 
+ADJACENT_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
 
 class ActionManager:
     def __init__(self, unit_manager: UnitManager, pathfinder: PathFinderManager, spawn_manager: SpawnManager,
@@ -20,9 +26,35 @@ class ActionManager:
         self.pathfinder = pathfinder
         self.spawn_manager = spawn_manager
         self.target_manager = target_manager
+        self.compiled_map = None
+        self.line_of_sight = None
+        self._enemy_holders_by_segment = None
+        self._enemy_holder_ids = set()
+        self.threat_map = None
+        self.play_order: Optional[PlayOrderTable] = None
+
+    def set_line_of_sight(self, line_of_sight: LineOfSight):
+        self.line_of_sight = line_of_sight
 
-    def init_tick(self, tick: Tick):
+    def init_tick(self, tick: Tick, delta: Optional[TickDelta] = None):
         self.tick: Tick = tick
+        self.compiled_map = self.pathfinder.get_compiled_map()
+        enemy_holder_ids = {enemy.id for enemy in self.unit_manager.get_enemy_holders()}
+        if (delta is None or delta.map_changed or self._enemy_holders_by_segment is None
+                or not (delta.moved_unit_ids | delta.changed_unit_ids).isdisjoint(
+                    enemy_holder_ids | self._enemy_holder_ids)):
+            # index inverse : segment de los -> ids des porteurs ennemis qui s'y trouvent, refait seulement quand un
+            # porteur ennemi (de ce tick ou du précédent) a bougé ou changé
+            self._enemy_holders_by_segment = {}
+            for enemy in self.unit_manager.get_enemy_holders():
+                for segment_id in self.line_of_sight.get_segments(self.compiled_map.index_of(enemy.position)):
+                    if segment_id != NO_SEGMENT:
+                        self._enemy_holders_by_segment.setdefault(segment_id, []).append(enemy.id)
+        self._enemy_holder_ids = enemy_holder_ids
+        if delta is None or delta.play_orderings_changed or self.play_order is None:
+            self.play_order = PlayOrderTable(tick.teamPlayOrderings, [team.id for team in tick.teams])
+        # l'ordre de jeu change à chaque tick
+        self.threat_map = None
 
     def get_optimal_spawn(self, unit: PrioritizedUnit) -> CommandAction:
         # Diamonds to Target
@@ -46,6 +78,14 @@ class ActionManager:
         else:
             return self.move_to_nearest_diamond(unit)
 
+    def get_threat_map(self) -> ThreatMap:
+        if self.threat_map is None:
+            next_tick = self.tick.tick + 1
+            enemies = [(enemy.position, self.play_order.get_rank(next_tick, enemy.teamId))
+                       for enemy in self.unit_manager.get_spawned_enemy_units()]
+            self.threat_map = ThreatMap(self.compiled_map, enemies)
+        return self.threat_map
+
     def get_optimal_hodler_move(self, unit: Unit, corners) -> CommandAction:
         current_enemy_units_positions = [unit.position for unit in self.unit_manager.get_spawned_enemy_units()]
         if unit.isSummoning:
@@ -56,8 +96,8 @@ class ActionManager:
             return self.create_drop_action(unit)
         elif (self.tick.tick < self.tick.totalTick - 7
               and not unit.isSummoning
-              and not unit.diamondId in [x.id for x in self.tick.map.diamonds if x.summonLevel == 5]
-              and self.summoning_is_safe(unit, current_enemy_units_positions)
+              and not unit.diamondId in {x.id for x in self.tick.map.diamonds if x.summonLevel == 5}
+              and self.summoning_is_safe(unit)
         ):
             return self.create_summon_action(unit)
         else:
@@ -68,13 +108,22 @@ class ActionManager:
             return self.create_move_action(unit, new_pos)
 
     def move_to_nearest_diamond(self, unit: PrioritizedUnit) -> CommandAction:
+        # diamant donné par l'assignation globale du tick, s'il est atteignable malgré les alliés
+        assigned_target = self.target_manager.get_assigned_target(unit)
+        if assigned_target:
+            target_path = self.pathfinder.get_unit_target_path(unit, assigned_target, OCCUPIED_BY_ALLY)
+            if target_path:
+                return self.create_move_action(unit, target_path.get_next_position())
+
         # formating targets
         target_list = self.target_manager.get_prioritized_target_list(unit)
         if target_list:
-            allies_position = [unit.position for unit in self.unit_manager.get_spawned_allied_units()]
             for target in target_list:
+                # diamant réservé par une autre unité, même à un tick précédent
+                if not self.target_manager.target_is_available_for_unit(unit, target.position):
+                    continue
                 # finding nearest diamond
-                target_path = self.pathfinder.get_target_path(unit.position, target, allies_position)
+                target_path = self.pathfinder.get_unit_target_path(unit, target, OCCUPIED_BY_ALLY)
                 if target_path:
                     # setting target
                     self.target_manager.set_target_of_unit(unit, target_path.target)
@@ -82,12 +131,13 @@ class ActionManager:
                     next_position = target_path.get_next_position()
                     return self.create_move_action(unit, next_position)
 
+        self.target_manager.release_unit(unit)
         return self.move_to_nearest_player_without_diamond(unit)
 
     def move_to_nearest_player_without_diamond(self, unit: Unit) -> CommandAction:
         free_enemies = [Target(TargetType.UNIT, e_unit, e_unit.position) for e_unit in
                         self.unit_manager.get_spawned_enemy_units() if
-                        not e_unit.hasDiamond and self.tick.map.get_tile_type_at(e_unit.position) == TileType.EMPTY]
+                        not e_unit.hasDiamond and self.compiled_map.is_empty(e_unit.position)]
         target_path = self.pathfinder.get_nearest_target(unit.position, free_enemies)
         if target_path:
             if len(target_path.path) == 2:
@@ -98,42 +148,30 @@ class ActionManager:
 
     def create_move_action(self, unit: Unit, destination: Position) -> CommandAction:
         if not unit.hasDiamond:
-            enemies_nearby = [enemies for enemies in self.unit_manager.get_spawned_enemy_units() if
-                              self.tick.map.get_tile_type_at(
-                                  enemies.position) == TileType.EMPTY and self.pathfinder.simple_distance(
-                                  enemies.position, unit.position) < 1.5]
+            enemies_nearby = self.get_enemies_nearby(unit)
             if unit.position:
-                enemies_with_diamond_in_los = [enemy for enemy in self.unit_manager.get_spawned_enemy_units() if
-                                enemy.position in self.get_unit_los(unit) and
-                                enemy.hasDiamond
-                ]
+                enemies_with_diamond_in_los = self.get_enemy_holders_in_los(unit)
             if enemies_nearby:
-                if self.tick.map.get_tile_type_at(unit.position) == TileType.EMPTY:
+                if self.compiled_map.is_empty(unit.position):
                     return CommandAction(action=CommandType.ATTACK, unitId=unit.id, target=enemies_nearby[0].position)
                 else:
                     delta_x = enemies_nearby[0].position.x - unit.position.x
                     if delta_x:  # si delta_x ça veux dire qu'il est à droite ou à gauche
-                        try:
-                            pos = Position(enemies_nearby[0].position.x, enemies_nearby[0].position.y + 1)
-                            if self.tick.map.get_tile_type_at(pos) == TileType.EMPTY:
-                                return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
-
-                            pos = Position(enemies_nearby[0].position.x, enemies_nearby[0].position.y - 1)
-                            if self.tick.map.get_tile_type_at(pos) == TileType.EMPTY:
-                                return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
-                        except:
-                            pass
+                        pos = Position(enemies_nearby[0].position.x, enemies_nearby[0].position.y + 1)
+                        if self.compiled_map.is_empty(pos):
+                            return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
+
+                        pos = Position(enemies_nearby[0].position.x, enemies_nearby[0].position.y - 1)
+                        if self.compiled_map.is_empty(pos):
+                            return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
                     else:
-                        try:
-                            pos = Position(enemies_nearby[0].position.x + 1, enemies_nearby[0].position.y)
-                            if self.tick.map.get_tile_type_at(pos) == TileType.EMPTY:
-                                return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
-
-                            pos = Position(enemies_nearby[0].position.x - 1, enemies_nearby[0].position.y)
-                            if self.tick.map.get_tile_type_at(pos) == TileType.EMPTY:
-                                return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
-                        except:
-                            pass
+                        pos = Position(enemies_nearby[0].position.x + 1, enemies_nearby[0].position.y)
+                        if self.compiled_map.is_empty(pos):
+                            return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
+
+                        pos = Position(enemies_nearby[0].position.x - 1, enemies_nearby[0].position.y)
+                        if self.compiled_map.is_empty(pos):
+                            return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=pos)
                 return CommandAction(action=CommandType.MOVE, unitId=unit.id, target=self.find_free_adjacent_tile(unit))
             elif enemies_with_diamond_in_los:
                 #TODO rendre mieux?
@@ -151,155 +189,80 @@ class ActionManager:
 
     def find_free_adjacent_tile(self, unit: Unit) -> Position:
         current_unit_positions = self.get_current_unit_positions()
-        try:
-            pos = Position(unit.position.x - 1, unit.position.y)
-            if (self.tick.map.get_tile_type_at(pos) == TileType.EMPTY
-                    and pos not in current_unit_positions):
-                return pos
-        except:
-            pass
-        try:
-            pos = Position(unit.position.x + 1, unit.position.y)
-            if (self.tick.map.get_tile_type_at(pos) == TileType.EMPTY
-                    and pos not in current_unit_positions):
+        for offset_x, offset_y in ADJACENT_OFFSETS:
+            pos = Position(unit.position.x + offset_x, unit.position.y + offset_y)
+            if self.compiled_map.is_empty(pos) and pos not in current_unit_positions:
                 return pos
-        except:
-            pass
-        try:
-            pos = Position(unit.position.x, unit.position.y - 1)
-            if (self.tick.map.get_tile_type_at(pos) == TileType.EMPTY
-                    and pos not in current_unit_positions):
-                return pos
-        except:
-            pass
-        try:
-            pos = Position(unit.position.x, unit.position.y + 1)
-            if (self.tick.map.get_tile_type_at(pos) == TileType.EMPTY
-                    and pos not in current_unit_positions):
-                return pos
-        except:
-            pass
 
-    def get_current_unit_positions(self):
-        current_unit_positions = []
-        for team in self.tick.teams:
-            for unit in team.units:
-                current_unit_positions.append(unit.position)
-        return current_unit_positions
+    def get_enemies_nearby(self, unit: Unit) -> List[Unit]:
+        """Spawned enemies off spawn tiles on the tile of unit or next to it, in the order of the tick message."""
+        if unit.position is None:
+            return []
+        enemies = []
+        for offset_x, offset_y in ((0, 0),) + ADJACENT_OFFSETS:
+            pos = Position(unit.position.x + offset_x, unit.position.y + offset_y)
+            other = self.unit_manager.get_unit_at(pos)
+            if (other is not None and other.teamId != self.tick.teamId and other.hasSpawned
+                    and self.compiled_map.is_empty(pos)):
+                enemies.append(other)
+        return sorted(enemies, key=self.unit_manager.get_unit_order)
+
+    def get_current_unit_positions(self) -> Set[Position]:
+        return self.unit_manager.get_unit_positions()
 
     def get_current_enemy_units(self) -> List[Unit]:
-        current_enemy_units = []
-        for team in self.tick.teams:
-            if team.id != self.tick.teamId:
-                for unit in team.units:
-                    if unit.hasSpawned:
-                        current_enemy_units.append(unit)
-        return current_enemy_units
+        return self.unit_manager.get_spawned_enemy_units()
 
     def get_nearest_enemy_position(self, unit: Unit, enemy_pos: List[Position]):
         if not enemy_pos:
             return None
-        closest_pos = None
+        nearest_pos = self.get_threat_map().get_nearest_enemy_position(unit.position)
+        if nearest_pos is not None:
+            return nearest_pos
         for pos in enemy_pos:
             if pos:
-                closest_pos = pos
-                break
-        if closest_pos:
-            closest_distance = self.get_distance(unit.position, closest_pos)
-            if closest_distance is not None:
-                for pos in enemy_pos:
-                    current_distance = self.get_distance(unit.position, pos)
-                    if current_distance is not None and current_distance < closest_distance:
-                        closest_pos = pos
-                        closest_distance = current_distance
-        return closest_pos
+                return pos
+        return None
 
     def move_away_from_target_pos(self, unit: Unit, target_pos: Position) -> Position:
         current_unit_positions = self.get_current_unit_positions()
         current_distance = self.get_distance(unit.position, target_pos)
         best_position = unit.position
+        if current_distance is None:
+            return best_position
 
-        diamond_list_position_on_ground = [diamond.position for diamond in self.tick.map.diamonds if
-                                           not diamond.ownerId]
+        diamond_positions_on_ground = {diamond.position for diamond in self.tick.map.diamonds if not diamond.ownerId}
 
-        try:
-            new_pos = Position(unit.position.x - 1, unit.position.y)
-            is_diamond_on_ground = [position for position in diamond_list_position_on_ground if
-                                    position.x == new_pos.x and position.y == new_pos.y]
-            if self.tick.map.get_tile_type_at(new_pos) == TileType.EMPTY and not is_diamond_on_ground:
+        for offset_x, offset_y in ADJACENT_OFFSETS:
+            new_pos = Position(unit.position.x + offset_x, unit.position.y + offset_y)
+            if self.compiled_map.is_empty(new_pos) and new_pos not in diamond_positions_on_ground:
                 new_distance = self.get_distance(new_pos, target_pos)
 
-                if new_pos not in current_unit_positions and new_distance > current_distance:
+                if (new_distance is not None and new_pos not in current_unit_positions
+                        and new_distance > current_distance):
                     best_position = new_pos
                     current_distance = new_distance
 
-        except:
-            pass
-        try:
-            new_pos = Position(unit.position.x + 1, unit.position.y)
-            is_diamond_on_ground = [position for position in diamond_list_position_on_ground if
-                                    position.x == new_pos.x and position.y == new_pos.y]
-            if self.tick.map.get_tile_type_at(new_pos) == TileType.EMPTY and not is_diamond_on_ground:
-                new_distance = self.get_distance(new_pos, target_pos)
-
-                if new_pos not in current_unit_positions and new_distance > current_distance:
-                    best_position = new_pos
-                    current_distance = new_distance
-        except:
-            pass
-        try:
-            new_pos = Position(unit.position.x, unit.position.y - 1)
-            is_diamond_on_ground = [position for position in diamond_list_position_on_ground if
-                                    position.x == new_pos.x and position.y == new_pos.y]
-            if self.tick.map.get_tile_type_at(new_pos) == TileType.EMPTY and not is_diamond_on_ground:
-                new_distance = self.get_distance(new_pos, target_pos)
-
-                if new_pos not in current_unit_positions and new_distance > current_distance:
-                    best_position = new_pos
-                    current_distance = new_distance
-        except:
-            pass
-        try:
-            new_pos = Position(unit.position.x, unit.position.y + 1)
-            is_diamond_on_ground = [position for position in diamond_list_position_on_ground if
-                                    position.x == new_pos.x and position.y == new_pos.y]
-            if self.tick.map.get_tile_type_at(new_pos) == TileType.EMPTY and not is_diamond_on_ground:
-                new_distance = self.get_distance(new_pos, target_pos)
-
-                if new_pos not in current_unit_positions and new_distance > current_distance:
-                    best_position = new_pos
-                    current_distance = new_distance
-        except:
-            pass
-
         return best_position
 
     def position_is_dangerous(self, unit: Unit, corners) -> bool:
-        current_enemy_units = [unit for unit in self.unit_manager.get_spawned_enemy_units()]
-        for enemy_unit in current_enemy_units:
-            diffx = abs(unit.position.x - enemy_unit.position.x )
-            diffy = abs(unit.position.y - enemy_unit.position.y )
-            diff = diffy + diffx
-
-            if diff <= 1 or diff <= 2 and self.is_higher_priority(enemy_unit, unit) and unit.position in [my_corner[0] for my_corner in corners]:
-                return True
-            elif self.is_higher_priority(unit, enemy_unit):
-                continue
-
-        return False
-
-    def summoning_is_safe(self, unit: Unit, enemy_positions: List[Position]) -> bool:
-        # inefficient
+        distance, rank = self.get_threat_map().get_danger(unit.position)
+        if distance is None or distance > 2:
+            return False
+        if distance <= 1:
+            return True
+        # à 2 cases, dangereux seulement dans un coin contre un ennemi qui joue avant nous
+        return (self.compiled_map.index_of(unit.position) in corners
+                and rank < self.get_team_priority_level(unit.teamId))
+
+    def summoning_is_safe(self, unit: Unit) -> bool:
         unit_diamond = [x for x in self.tick.map.diamonds if x.id == unit.diamondId][0]
-        for pos in enemy_positions:
-            distance = self.get_distance(unit.position, pos)
-            if distance is not None and distance <= unit_diamond.summonLevel + 3:
-                return False
-        return True
+        distance = self.get_threat_map().get_distance(unit.position)
+        # distance en cases du chemin, comme TargetPath.get_distance
+        return distance is None or distance + 1 > unit_diamond.summonLevel + 3
 
     def get_distance(self, origin: Position, destination: Position) -> int:
-        target_path = self.pathfinder.get_nearest_target(origin, [Target(TargetType.EMPTY, None, destination)])
-        return target_path.get_distance() if target_path else None
+        return self.pathfinder.get_distance(origin, destination)
 
     def is_higher_priority(self, unit1: Unit, unit2: Unit):
             return self.get_team_priority_level(unit1.teamId) < self.get_team_priority_level(unit2.teamId)
@@ -308,50 +271,28 @@ class ActionManager:
             return self.get_team_priority_level_in_2_turns(unit1.teamId) < self.get_team_priority_level(unit2.teamId)
 
     def get_team_priority_level(self, team_id: str) -> int:
-        return self.tick.teamPlayOrderings[str(self.tick.tick+1)].index(team_id)
+        return self.play_order.get_rank(self.tick.tick + 1, team_id)
 
     def get_team_priority_level_in_2_turns(self, team_id: str) -> int:
-        return self.tick.teamPlayOrderings[str(self.tick.tick+2)].index(team_id)
+        return self.play_order.get_rank(self.tick.tick + 2, team_id)
 
     def get_unit_los(self, unit: Unit) -> List[Position]:
         # aucune los si sur spawn pour pas viner from spawn
         if unit.hasSpawned:
-            if self.tick.map.get_tile_type_at(unit.position) == TileType.SPAWN:
-                return []
-
-            los = []
-            pos_to_check = Position(unit.position.x+1, unit.position.y)
-            try:
-                while self.tick.map.get_tile_type_at(pos_to_check) == TileType.EMPTY:
-                    los.append(pos_to_check)
-                    pos_to_check = Position(pos_to_check.x+1, pos_to_check.y)
-            except:
-                pass
-
-            pos_to_check = Position(unit.position.x-1, unit.position.y)
-            try:
-                while self.tick.map.get_tile_type_at(pos_to_check) == TileType.EMPTY:
-                    los.append(pos_to_check)
-                    pos_to_check = Position(pos_to_check.x-1, pos_to_check.y)
-            except:
-                pass
-
-            pos_to_check = Position(unit.position.x, unit.position.y+1)
-            try:
-                while self.tick.map.get_tile_type_at(pos_to_check) == TileType.EMPTY:
-                    los.append(pos_to_check)
-                    pos_to_check = Position(pos_to_check.x, pos_to_check.y+1)
-            except:
-                pass
-
-            pos_to_check = Position(unit.position.x, unit.position.y-1)
-            try:
-                while self.tick.map.get_tile_type_at(pos_to_check) == TileType.EMPTY:
-                    los.append(pos_to_check)
-                    pos_to_check = Position(pos_to_check.x, pos_to_check.y-1)
-            except:
-                pass
-
-            return los
+            index = self.compiled_map.index_of(unit.position)
+            return [self.compiled_map.position_of(i) for i in self.line_of_sight.get_visible_indexes(index)]
 
         return []
+
+    def get_enemy_holders_in_los(self, unit: Unit) -> List[Unit]:
+        """Enemy holders in the los of unit, in the order of the tick message like the original scan."""
+        if not unit.hasSpawned:
+            return []
+        holders = []
+        for segment_id in self.line_of_sight.get_segments(self.compiled_map.index_of(unit.position)):
+            if segment_id != NO_SEGMENT:
+                holders.extend(self.unit_manager.get_unit(enemy_id)
+                               for enemy_id in self._enemy_holders_by_segment.get(segment_id, []))
+        # un porteur sur la case même de l'unité est dans ses deux segments mais pas dans sa los
+        holders = [enemy for enemy in holders if enemy.position != unit.position]
+        return sorted(holders, key=self.unit_manager.get_unit_order)
@@ -0,0 +1,77 @@
+from typing import List, Optional, Sequence
+
+INF = float("inf")
+
+
+def solve_assignment(costs: Sequence[Sequence[Optional[float]]]) -> List[Optional[int]]:
+    """
+    Minimum cost assignment of rows to distinct columns (Hungarian algorithm, shortest augmenting paths with
+    potentials, O(n² m) for n <= m).
+
+    costs[row][column] is None when the row cannot take that column. Returns the column of every row, None for the
+    rows left without one (more rows than columns, or no allowed column left).
+    """
+    row_count = len(costs)
+    column_count = len(costs[0]) if row_count else 0
+    if not row_count or not column_count:
+        return [None] * row_count
+    if row_count > column_count:
+        transposed = [[costs[row][column] for row in range(row_count)] for column in range(column_count)]
+        rows_of_columns = solve_assignment(transposed)
+        assignment = [None] * row_count
+        for column, row in enumerate(rows_of_columns):
+            if row is not None:
+                assignment[row] = column
+        return assignment
+
+    # une paire interdite coûte plus que toutes les paires permises réunies, puis est retirée du résultat
+    finite = [abs(cost) for row in costs for cost in row if cost is not None]
+    forbidden_cost = (max(finite, default=0) + 1) * (row_count + 1)
+    matrix = [[forbidden_cost if cost is None else cost for cost in row] for row in costs]
+
+    # indices à partir de 1, la colonne 0 est la racine des chemins augmentants
+    row_potentials = [0.0] * (row_count + 1)
+    column_potentials = [0.0] * (column_count + 1)
+    row_of_column = [0] * (column_count + 1)
+    previous_column = [0] * (column_count + 1)
+    for row in range(1, row_count + 1):
+        row_of_column[0] = row
+        current_column = 0
+        min_slack = [INF] * (column_count + 1)
+        used = [False] * (column_count + 1)
+        while True:
+            used[current_column] = True
+            current_row = row_of_column[current_column]
+            costs_of_row = matrix[current_row - 1]
+            row_potential = row_potentials[current_row]
+            delta = INF
+            next_column = 0
+            for column in range(1, column_count + 1):
+                if not used[column]:
+                    slack = costs_of_row[column - 1] - row_potential - column_potentials[column]
+                    if slack < min_slack[column]:
+                        min_slack[column] = slack
+                        previous_column[column] = current_column
+                    if min_slack[column] < delta:
+                        delta = min_slack[column]
+                        next_column = column
+            for column in range(column_count + 1):
+                if used[column]:
+                    row_potentials[row_of_column[column]] += delta
+                    column_potentials[column] -= delta
+                else:
+                    min_slack[column] -= delta
+            current_column = next_column
+            if row_of_column[current_column] == 0:
+                break
+        while current_column:
+            column = previous_column[current_column]
+            row_of_column[current_column] = row_of_column[column]
+            current_column = column
+
+    assignment = [None] * row_count
+    for column in range(1, column_count + 1):
+        row = row_of_column[column]
+        if row and costs[row - 1][column - 1] is not None:
+            assignment[row - 1] = column - 1
+    return assignment
@@ -0,0 +1,100 @@
+from typing import Optional, Tuple
+
+from game_message import Position, TickMap, TileType
+
+WALL = 0
+EMPTY = 1
+SPAWN = 2
+
+TILE_CODES = {"WALL": WALL, "EMPTY": EMPTY, "SPAWN": SPAWN}
+TILE_TYPES = {WALL: TileType.WALL, EMPTY: TileType.EMPTY, SPAWN: TileType.SPAWN}
+
+
+class CompiledMap:
+    """
+    Static version of a TickMap built once per game.
+
+    Tiles are stored in a flat bytearray surrounded by a one tile wall border, so a neighbour lookup never goes out of
+    bounds. A tile index is (x + 1) * stride + (y + 1).
+    """
+
+    def __init__(self, tick_map: TickMap):
+        self.size_x = tick_map.get_map_size_x()
+        self.size_y = tick_map.get_map_size_y()
+        self.stride = self.size_y + 2
+        self.size = self.stride * (self.size_x + 2)
+
+        tiles = bytearray(self.size)
+        for x, column in enumerate(tick_map.tiles):
+            base = (x + 1) * self.stride + 1
+            tiles[base:base + self.size_y] = bytes(map(TILE_CODES.__getitem__, column))
+        self.set_tiles(tiles)
+
+    @classmethod
+    def from_tiles(cls, size_x: int, size_y: int, tiles: bytes) -> "CompiledMap":
+        """Rebuilds a compiled map from the tiles of another one, e.g. in a worker process."""
+        compiled_map = cls.__new__(cls)
+        compiled_map.size_x = size_x
+        compiled_map.size_y = size_y
+        compiled_map.stride = size_y + 2
+        compiled_map.size = compiled_map.stride * (size_x + 2)
+        compiled_map.set_tiles(bytearray(tiles))
+        return compiled_map
+
+    def set_tiles(self, tiles: bytearray):
+        self._positions = [None] * self.size
+        self.tiles = tiles
+
+        # décalages de (0, -1), (0, 1), (-1, 0), (1, 0)
+        self.offsets = (-1, 1, -self.stride, self.stride)
+        # neighbours : cases traversables depuis un spawn, empty_neighbours : depuis une case vide
+        self.neighbours = [()] * self.size
+        self.empty_neighbours = [()] * self.size
+        down, up, left, right = self.offsets
+        for index in range(self.size):
+            if tiles[index] != WALL:
+                adjacent = (index + down, index + up, index + left, index + right)
+                self.neighbours[index] = tuple([i for i in adjacent if tiles[i] != WALL])
+                self.empty_neighbours[index] = tuple([i for i in adjacent if tiles[i] == EMPTY])
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.size_x and 0 <= y < self.size_y
+
+    def index(self, x: int, y: int) -> int:
+        return (x + 1) * self.stride + y + 1
+
+    def index_of(self, position: Position) -> Optional[int]:
+        if not self.contains(position.x, position.y):
+            return None
+        return (position.x + 1) * self.stride + position.y + 1
+
+    def coordinates_of(self, index: int) -> Tuple[int, int]:
+        x, y = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def position_of(self, index: int) -> Position:
+        """Positions are interned: the same index always gives the same Position object."""
+        position = self._positions[index]
+        if position is None:
+            x, y = divmod(index, self.stride)
+            position = self._positions[index] = Position(x - 1, y - 1)
+        return position
+
+    def tile_at(self, x: int, y: int) -> int:
+        if not self.contains(x, y):
+            return WALL
+        return self.tiles[(x + 1) * self.stride + y + 1]
+
+    def get_tile_type_at(self, position: Position) -> TileType:
+        """Same as TickMap.get_tile_type_at, but a position out of the map is a wall instead of an exception."""
+        return TILE_TYPES[self.tile_at(position.x, position.y)]
+
+    def is_empty(self, position: Position) -> bool:
+        return self.tile_at(position.x, position.y) == EMPTY
+
+    def is_spawn(self, position: Position) -> bool:
+        return self.tile_at(position.x, position.y) == SPAWN
+
+    def walkable_neighbours(self, start: int):
+        """Neighbour table to use for a search starting at the given index: spawns are only walkable from a spawn."""
+        return self.neighbours if self.tiles[start] == SPAWN else self.empty_neighbours
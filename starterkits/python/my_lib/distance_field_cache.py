@@ -0,0 +1,94 @@
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from game_message import Position
+from my_lib.compiled_map import CompiledMap, EMPTY, WALL
+
+UNREACHABLE = -1
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def compute_distance_field(compiled_map: CompiledMap, target_index: int, from_spawn: bool) -> array:
+    """Moves from every tile to target_index, UNREACHABLE where it cannot be reached, with a breadth first search."""
+    field = array("i", [UNREACHABLE]) * compiled_map.size
+    target_tile = compiled_map.tiles[target_index]
+    if target_tile == WALL or (not from_spawn and target_tile != EMPTY):
+        return field
+
+    neighbours = compiled_map.neighbours if from_spawn else compiled_map.empty_neighbours
+    field[target_index] = 0
+    frontier = [target_index]
+    steps = 0
+    while frontier:
+        steps += 1
+        next_frontier = []
+        for current in frontier:
+            for child in neighbours[current]:
+                if field[child] == UNREACHABLE:
+                    field[child] = steps
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return field
+
+
+class DistanceFieldCache:
+    """
+    Distance fields to target tiles, computed on first request with a breadth first search from the target.
+
+    A field only depends on the static map, so it is shared by every unit and kept until the compiled map changes or
+    it is evicted (least recently used first) to stay under max_bytes. There is one field for origins on an empty tile
+    and one for origins on a spawn, since spawns are only walkable when starting from a spawn.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._compiled_map: Optional[CompiledMap] = None
+        self._max_bytes = max_bytes
+        self._max_fields = 1
+        self._fields = OrderedDict()
+
+    def set_compiled_map(self, compiled_map: CompiledMap):
+        if compiled_map is not self._compiled_map:
+            self._compiled_map = compiled_map
+            self._max_fields = max(1, self._max_bytes // (compiled_map.size * array("i").itemsize))
+            self._fields.clear()
+
+    def clear(self):
+        self._fields.clear()
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get_field(self, target_index: int, from_spawn: bool = False) -> array:
+        key = (target_index, from_spawn)
+        field = self._fields.get(key)
+        if field is not None:
+            self._fields.move_to_end(key)
+            return field
+
+        field = compute_distance_field(self._compiled_map, target_index, from_spawn)
+        self.add_field(target_index, from_spawn, field)
+        return field
+
+    def has_field(self, target_index: int, from_spawn: bool = False) -> bool:
+        return (target_index, from_spawn) in self._fields
+
+    def add_field(self, target_index: int, from_spawn: bool, field: array):
+        """Adds a field computed elsewhere (see compute_distance_field) for the current compiled map."""
+        self._fields[(target_index, from_spawn)] = field
+        if len(self._fields) > self._max_fields:
+            self._fields.popitem(last=False)
+
+    def get_distance(self, origin: Position, destination: Position) -> Optional[int]:
+        """Same value as astar(origin, destination).get_distance(), without any occupancy: None if unreachable."""
+        compiled_map = self._compiled_map
+        origin_index = compiled_map.index_of(origin)
+        destination_index = compiled_map.index_of(destination)
+        if origin_index is None or destination_index is None or origin_index == destination_index:
+            return None
+
+        origin_tile = compiled_map.tiles[origin_index]
+        if origin_tile == WALL:
+            return None
+        steps = self.get_field(destination_index, origin_tile != EMPTY)[origin_index]
+        return steps + 1 if steps != UNREACHABLE else None
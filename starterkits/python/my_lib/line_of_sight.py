@@ -0,0 +1,54 @@
+from array import array
+from typing import List, Tuple
+
+from my_lib.compiled_map import CompiledMap, EMPTY
+
+NO_SEGMENT = -1
+
+
+class LineOfSight:
+    """
+    Lines of sight of every tile, precomputed once per game since walls never move.
+
+    A segment is a maximal run of empty tiles along the x or the y axis. Two tiles see each other when they share a
+    segment, so the tiles seen by a tile are also the tiles that can see it. Spawns see nothing.
+    """
+
+    def __init__(self, compiled_map: CompiledMap):
+        self._compiled_map = compiled_map
+        self.x_segments = array("i", [NO_SEGMENT]) * compiled_map.size
+        self.y_segments = array("i", [NO_SEGMENT]) * compiled_map.size
+        self.segments: List[Tuple[int, ...]] = []
+        self._build_segments(self.x_segments, compiled_map.stride)
+        self._build_segments(self.y_segments, 1)
+
+    def _build_segments(self, tile_segments: array, step: int):
+        tiles = self._compiled_map.tiles
+        for index in range(self._compiled_map.size):
+            # un segment commence sur une case vide dont la précédente n'est pas vide
+            if tiles[index] != EMPTY or tiles[index - step] == EMPTY:
+                continue
+            segment = []
+            current = index
+            while tiles[current] == EMPTY:
+                segment.append(current)
+                tile_segments[current] = len(self.segments)
+                current += step
+            self.segments.append(tuple(segment))
+
+    def get_segments(self, index: int) -> Tuple[int, int]:
+        return self.x_segments[index], self.y_segments[index]
+
+    def can_see(self, index: int, other_index: int) -> bool:
+        if index == other_index or self.x_segments[index] == NO_SEGMENT:
+            return False
+        return (self.x_segments[index] == self.x_segments[other_index]
+                or self.y_segments[index] == self.y_segments[other_index])
+
+    def get_visible_indexes(self, index: int) -> List[int]:
+        """Every tile seen from index, which are also the tiles that can see index."""
+        visible = []
+        for segment_id in self.get_segments(index):
+            if segment_id != NO_SEGMENT:
+                visible.extend(i for i in self.segments[segment_id] if i != index)
+        return visible
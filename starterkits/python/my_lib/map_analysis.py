@@ -0,0 +1,51 @@
+from typing import List
+
+from game_message import Position
+from my_lib.compiled_map import CompiledMap, EMPTY, SPAWN
+
+
+def tile_bitset(compiled_map: CompiledMap, tile_code: int) -> int:
+    """Bitset of the tiles of the given type: bit i is set when compiled_map.tiles[i] == tile_code."""
+    table = bytes(ord("1") if code == tile_code else ord("0") for code in range(256))
+    return int(compiled_map.tiles.translate(table)[::-1], 2)
+
+
+def bitset_to_indexes(bitset: int) -> List[int]:
+    bits = bin(bitset)[:1:-1]
+    indexes = []
+    index = bits.find("1")
+    while index != -1:
+        indexes.append(index)
+        index = bits.find("1", index + 1)
+    return indexes
+
+
+class MapAnalysis:
+    """
+    Static features of the map, derived once per game.
+
+    Every tile is a bit of a Python int, so shifting the empty tiles bitset by 1 or by the stride gives the empty
+    neighbours of all tiles at once and each feature is a handful of masks. The wall border keeps shifts from wrapping.
+    """
+
+    def __init__(self, compiled_map: CompiledMap):
+        stride = compiled_map.stride
+        empty = tile_bitset(compiled_map, EMPTY)
+        spawn = tile_bitset(compiled_map, SPAWN)
+
+        # bit i de haut : la case au-dessus de i (y + 1) est vide, etc.
+        haut = empty >> 1
+        bas = empty << 1
+        droite = empty >> stride
+        gauche = empty << stride
+        any_neighbour = haut | bas | droite | gauche
+        two_neighbours_or_more = (haut & bas) | (gauche & droite) | ((haut | bas) & (gauche | droite))
+
+        self.corners = set(bitset_to_indexes(empty & (haut ^ bas) & (gauche ^ droite)))
+        self.dead_ends = set(bitset_to_indexes(empty & any_neighbour & ~two_neighbours_or_more))
+        # couloir d'une case de large
+        self.chokepoints = set(bitset_to_indexes(
+            empty & ((haut & bas & ~(gauche | droite)) | (gauche & droite & ~(haut | bas)))))
+        # un spawn n'est utile que s'il touche une case vide
+        self.spawns: List[Position] = [compiled_map.position_of(index)
+                                       for index in bitset_to_indexes(spawn & any_neighbour)]
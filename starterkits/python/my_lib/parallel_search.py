@@ -0,0 +1,100 @@
+import math
+import multiprocessing
+import os
+import time
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from my_lib.compiled_map import CompiledMap
+from my_lib.distance_field_cache import compute_distance_field
+
+# (index de la cible, origine sur un spawn), comme les clés de DistanceFieldCache
+FieldKey = Tuple[int, bool]
+
+# plusieurs jobs par worker pour que les premiers champs reviennent avant la deadline
+JOBS_PER_WORKER = 4
+
+# carte compilée du processus de travail avec sa version, reconstruite quand la version reçue change
+_worker_map: Optional[Tuple[int, CompiledMap]] = None
+
+
+def warm_up(_) -> bool:
+    return True
+
+
+def compute_distance_fields(map_version: int, size_x: int, size_y: int, tiles: bytes,
+                            keys: List[FieldKey]) -> List[Tuple[FieldKey, bytes]]:
+    """Runs in a worker: the distance field of every key, as the bytes of its array."""
+    global _worker_map
+    if _worker_map is None or _worker_map[0] != map_version:
+        _worker_map = (map_version, CompiledMap.from_tiles(size_x, size_y, tiles))
+    compiled_map = _worker_map[1]
+    return [(key, compute_distance_field(compiled_map, *key).tobytes()) for key in keys]
+
+
+class ParallelSearchPool:
+    """
+    Persistent pool of worker processes computing distance fields, the breadth first searches behind the target
+    scoring and the global assignment, on several cores.
+
+    The workers are started with the pool, outside of any tick, and rebuild the compiled map from its tiles once per
+    map. Jobs not started by the deadline are cancelled, and a field still running then is picked up by a later call
+    once done.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self._workers = workers or os.cpu_count() or 1
+        # pas de fork : le processus a déjà des threads (planner, logs)
+        self._executor: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=self._workers, mp_context=multiprocessing.get_context("spawn"))
+        list(self._executor.map(warm_up, range(self._workers)))
+        self._map_version = 0
+        self._map_state = None
+        self._pending: Dict[Future, List[FieldKey]] = {}
+        self._pending_keys = set()
+
+    def set_compiled_map(self, compiled_map: CompiledMap):
+        """Fields still running for the previous map are dropped."""
+        self._map_version += 1
+        self._map_state = (self._map_version, compiled_map.size_x, compiled_map.size_y, bytes(compiled_map.tiles))
+        self._pending = {}
+        self._pending_keys = set()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending = {}
+        self._pending_keys = set()
+
+    def compute_distance_fields(self, keys: List[FieldKey], deadline: float) -> Dict[FieldKey, array]:
+        """
+        Sends the keys not already running to the workers, in order, and returns every field done by the deadline,
+        including fields sent by earlier calls. Without workers (shut down after a failure) nothing is computed.
+        """
+        if self._executor is None or self._map_state is None:
+            return {}
+        keys = [key for key in keys if key not in self._pending_keys]
+        if keys:
+            job_size = math.ceil(len(keys) / (self._workers * JOBS_PER_WORKER))
+            for start in range(0, len(keys), job_size):
+                job_keys = keys[start:start + job_size]
+                self._pending[self._executor.submit(compute_distance_fields, *self._map_state, job_keys)] = job_keys
+                self._pending_keys.update(job_keys)
+
+        # pas de timeout sans deadline : deadline - time.monotonic() est alors infini
+        timeout = None if math.isinf(deadline) else max(0.0, deadline - time.monotonic())
+        done, not_done = wait(list(self._pending), timeout=timeout)
+        # les jobs pas encore commencés n'occupent pas les cœurs du planning, ceux en cours reviendront plus tard
+        for future in not_done:
+            if future.cancel():
+                self._pending_keys.difference_update(self._pending.pop(future))
+        fields = {}
+        for future in done:
+            self._pending_keys.difference_update(self._pending.pop(future))
+            for key, raw_field in future.result():
+                field = array("i")
+                field.frombytes(raw_field)
+                fields[key] = field
+        return fields
@@ -1,189 +1,261 @@
-from copy import deepcopy
 from math import sqrt
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from game_message import Position, TickMap, TileType
+from game_message import Position, TickMap, Unit
+from my_lib.compiled_map import CompiledMap
+from my_lib.distance_field_cache import DistanceFieldCache
 from my_lib.models import Target, TargetPath
+from my_lib.profiler import profiler
+from my_lib.search import astar, build_path, multi_target_search, nearest_source_path
+from my_lib.tick_ingestor import TickDelta
 from my_lib.spawn_manager import SpawnManager
 from my_lib.unit_manager import UnitManager
 
+# flags de l'occupation des cases pour le tick courant
+OCCUPIED_BY_ALLY = 1
+OCCUPIED_BY_ENEMY = 2  # ennemi sans diamant, ou sur un spawn
+OCCUPIED_BY_ENEMY_HOLDER = 4
+OCCUPIED_BY_UNIT = OCCUPIED_BY_ALLY | OCCUPIED_BY_ENEMY | OCCUPIED_BY_ENEMY_HOLDER
+
+_NOT_MEMOIZED = object()
+
 
 class PathFinderManager:
-    def __init__(self, unit_manager: UnitManager, spawn_manager: SpawnManager):
+    def __init__(self, unit_manager: UnitManager, spawn_manager: SpawnManager, max_expansions: Optional[int] = None):
         self._tick_map: Optional[TickMap] = None
+        self._compiled_map: Optional[CompiledMap] = None
+        self._occupancy: Optional[bytearray] = None
+        self.distance_fields = DistanceFieldCache()
+        # unit id -> (blocked_mask, TargetPath, numéro du tick) suivi au tick précédent
+        self._unit_paths: Dict[str, Tuple[int, TargetPath, int]] = {}
+        self._tick_count = 0
+        self._delta: Optional[TickDelta] = None
+        # version de l'occupation, incrémentée à chaque reconstruction
+        self._occupancy_version = 0
+        # (origine, cible, blocked_mask, blacklist) -> chemin ou None, valable pour cette version de l'occupation
+        self._path_memo: Dict[Tuple[int, int, int, Optional[frozenset]], Optional[List]] = {}
+        self.path_memo_hits = 0
+        self.path_memo_misses = 0
+        # unit id -> case occupée au tick de la dernière mise à jour de l'occupation
+        self._unit_tiles: Dict[str, int] = {}
+        self._max_expansions = max_expansions
         self._unit_manager = unit_manager
         self._spawn_manager = spawn_manager
 
-    def set_tick_map(self, tick_map: TickMap):
+    def set_tick_map(self, tick_map: TickMap, delta: Optional[TickDelta] = None):
         self._tick_map = tick_map
+        self._tick_count += 1
+        self._delta = delta
+        if delta is None or self._occupancy is None:
+            self._occupancy = self.build_occupancy()
+            self.invalidate_path_memo()
+        elif delta.units_changed():
+            self.update_occupancy(delta)
+            self.invalidate_path_memo()
+        moving_unit_ids = {unit.id for unit in self._unit_manager.get_spawned_allied_units() if not unit.hasDiamond}
+        self._unit_paths = {unit_id: cached for unit_id, cached in self._unit_paths.items()
+                            if unit_id in moving_unit_ids}
+
+    def invalidate_path_memo(self):
+        self._occupancy_version += 1
+        self._path_memo = {}
+
+    def set_compiled_map(self, compiled_map: CompiledMap):
+        self._compiled_map = compiled_map
+        self.distance_fields.set_compiled_map(compiled_map)
+        # chemins, occupation et memo de l'ancienne carte ne valent plus rien (nouveaux murs)
+        self._occupancy = None
+        self._path_memo = {}
+        self._unit_paths = {}
+
+    def get_compiled_map(self) -> Optional[CompiledMap]:
+        return self._compiled_map
+
+    def build_occupancy(self) -> bytearray:
+        """Occupation flags of every tile of the compiled map for the current tick, see OCCUPIED_BY_*."""
+        occupancy = bytearray(self._compiled_map.size)
+        self._unit_tiles = {}
+        for unit, flag in self.get_unit_flags():
+            index = self._compiled_map.index_of(unit.position)
+            occupancy[index] |= flag
+            self._unit_tiles[unit.id] = index
+        return occupancy
+
+    def update_occupancy(self, delta: TickDelta):
+        """
+        Updates the occupancy in place from the tick delta: only the tiles a moved or changed unit left or entered,
+        and the tiles the delta reports as newly occupied or vacated, are recomputed.
+        """
+        compiled_map = self._compiled_map
+        updated_unit_ids = delta.moved_unit_ids | delta.changed_unit_ids
+        tiles = {compiled_map.index(x, y) for x, y in delta.newly_occupied}
+        tiles.update(compiled_map.index(x, y) for x, y in delta.vacated)
+        tiles.update(self._unit_tiles[unit_id] for unit_id in updated_unit_ids if unit_id in self._unit_tiles)
+        unit_flags = [(compiled_map.index_of(unit.position), unit.id, flag) for unit, flag in self.get_unit_flags()]
+        # le delta ne garde qu'un occupant par case : la case d'arrivée d'une unité qui rejoint une pile n'y est pas
+        tiles.update(index for index, unit_id, _ in unit_flags if unit_id in updated_unit_ids)
+
+        occupancy = self._occupancy
+        for index in tiles:
+            occupancy[index] = 0
+        # plusieurs unités peuvent partager une tuile de spawn : toutes celles des cases touchées sont réappliquées
+        self._unit_tiles = {}
+        for index, unit_id, flag in unit_flags:
+            self._unit_tiles[unit_id] = index
+            if index in tiles:
+                occupancy[index] |= flag
+
+    def get_unit_flags(self):
+        """(unit, OCCUPIED_BY_* flag) of every spawned unit."""
+        for unit in self._unit_manager.get_spawned_allied_units():
+            yield unit, OCCUPIED_BY_ALLY
+        for unit in self._unit_manager.get_spawned_enemy_units():
+            if unit.hasDiamond and not self._compiled_map.is_spawn(unit.position):
+                yield unit, OCCUPIED_BY_ENEMY_HOLDER
+            else:
+                yield unit, OCCUPIED_BY_ENEMY
+
+    def get_occupancy(self) -> Optional[bytearray]:
+        return self._occupancy
+
+    def is_occupied(self, position: Position, blocked_mask: int = OCCUPIED_BY_UNIT) -> bool:
+        index = self._compiled_map.index_of(position)
+        return index is not None and bool(self._occupancy[index] & blocked_mask)
+
+    def get_nearest_target(self, origin: Position, targets: List[Target], blacklisted_positions=None,
+                           blocked_mask: int = 0) -> Optional[TargetPath]:
+        """Path to the nearest reachable target, found with a single search from origin."""
+        if len(targets) == 1:
+            return self.get_target_path(origin, targets[0], blacklisted_positions, blocked_mask)
+
+        targets_by_index = self.get_targets_by_index(targets)
+        came_from, reached = multi_target_search(self._compiled_map, origin, targets_by_index, self._occupancy,
+                                                 blocked_mask, self.get_blacklist(blacklisted_positions),
+                                                 max_expansions=self._max_expansions)
+        if not reached:
+            return None
+        nearest_index = next(iter(reached))
+        return TargetPath(targets_by_index[nearest_index], build_path(self._compiled_map, came_from, nearest_index))
+
+    def get_target_distances(self, origin: Position, targets: List[Target], blacklisted_positions=None,
+                             blocked_mask: int = 0) -> List[Optional[int]]:
+        """Distance (as in TargetPath.get_distance) from origin to every target, None when unreachable."""
+        targets_by_index = self.get_targets_by_index(targets)
+        _, reached = multi_target_search(self._compiled_map, origin, targets_by_index, self._occupancy, blocked_mask,
+                                         self.get_blacklist(blacklisted_positions), settle_all=True,
+                                         max_expansions=self._max_expansions)
+        distances = []
+        for target in targets:
+            steps = reached.get(self._compiled_map.index_of(target.position))
+            distances.append(steps + 1 if steps is not None else None)
+        return distances
 
-    def get_nearest_target(self, origin: Position, targets: List[Target],
-                           blacklisted_positions=None) -> Optional[TargetPath]:
-        if blacklisted_positions is None:
-            blacklisted_positions = []
-        result_path = []
-        nearest_target_path = None
-        min_distance = 99999
+    def get_distance(self, origin: Position, destination: Position) -> Optional[int]:
+        """Distance (as in TargetPath.get_distance) ignoring units, read from the shared distance fields."""
+        return self.distance_fields.get_distance(origin, destination)
+
+    def get_targets_by_index(self, targets: List[Target]) -> Dict[int, Target]:
+        targets_by_index = {}
         for target in targets:
-            # todo garder les valeurs en cache pour évité de recalculer
-            target_path = self.get_target_path(origin, target, blacklisted_positions)
-            if not target_path:
-                continue
-            distance = target_path.get_distance()
-
-            if distance <= min_distance:
-                min_distance = distance
-                nearest_target_path = target_path
-
-        return nearest_target_path
-
-    def get_target_path(self, origin: Position, target: Target, blacklisted_positions=None) -> Optional[TargetPath]:
-        if blacklisted_positions is None:
-            blacklisted_positions = []
-        path = astar(self._tick_map, origin, target.position, blacklisted_positions)
+            index = self._compiled_map.index_of(target.position)
+            if index is not None:
+                targets_by_index.setdefault(index, target)
+        return targets_by_index
+
+    def get_target_path(self, origin: Position, target: Target, blacklisted_positions=None,
+                        blocked_mask: int = 0) -> Optional[TargetPath]:
+        """
+        Shortest path from origin to the target. Tiles whose occupancy matches blocked_mask are avoided without
+        copying the map; blacklisted_positions is kept for one-off obstacles that are not units.
+
+        Results, unreachable targets included, are memoized until the occupancy changes, so the same search asked
+        again during a tick (or on the next ticks if no unit moved) is free.
+        """
+        blacklist = self.get_blacklist(blacklisted_positions)
+        key = (self._compiled_map.index_of(origin), self._compiled_map.index_of(target.position), blocked_mask,
+               frozenset(blacklist) if blacklist else None)
+        path = self._path_memo.get(key, _NOT_MEMOIZED)
+        if path is _NOT_MEMOIZED:
+            self.path_memo_misses += 1
+            profiler.count("path_memo_misses")
+            path = astar(self._compiled_map, origin, target.position, self._occupancy, blocked_mask, blacklist,
+                         self._max_expansions)
+            self._path_memo[key] = path
+        else:
+            self.path_memo_hits += 1
+            profiler.count("path_memo_hits")
         if path:
             return TargetPath(target, path)
         return None
 
-    def find_optimal_spawn(self, targets: List[Target]):
-        optimal_spawn_and_target_path = None
-        spawns = self._spawn_manager.find_all_spawn()
-        min_distance = 99999
-        allied_unit_positions = [unit.position for unit in self._unit_manager.get_spawned_allied_units()]
-        enemy_unit_positions_in_spawn_or_with_no_gem = [unit.position for unit in
-                                                        self._unit_manager.get_spawned_enemy_units() if
-                                                        self._tick_map.get_tile_type_at(
-                                                            unit.position) == TileType.SPAWN or not unit.hasDiamond]
-        for spawn in spawns:
-            my_target = self.get_target_path(spawn, targets[0],
-                                             allied_unit_positions + enemy_unit_positions_in_spawn_or_with_no_gem)
-            if my_target is None:
-                continue
-            distance = my_target.get_distance()
-            if distance <= min_distance:
-                min_distance = len(my_target.path)
-                optimal_spawn_and_target_path = {"spawn": spawn, "target_path": my_target}
-        return optimal_spawn_and_target_path
-
-    @staticmethod
-    def simple_distance(position1, position2):
-        return sqrt(pow(abs(position1.x - position2.x) + 0.1, 2) + pow(abs(position1.y - position2.y) + 0.1, 2))
-
-
-class Node:
-    """A node class for A* Pathfinding"""
-
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
-
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return self.position == other.position
-
-    def __hash__(self):  # <-- added a hash method
-        return hash(self.position)
-
-
-def astar(tickmap: TickMap, start: Position, end: Position, blacklisted_positions=None):
-    """Returns a list of tuples as a path from the given start to the given end in the given maze"""
-    if blacklisted_positions is None:
-        blacklisted_positions = []
-    maze = deepcopy(tickmap.tiles)
-    for b_position in blacklisted_positions:
-        maze[b_position.x][b_position.y] = "WALL"
-    # Create start and end node
-    start_node = Node(None, (start.x, start.y))
-
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, (end.x, end.y))
-    end_node.g = end_node.h = end_node.f = 0
-
-    if start_node == end_node:
-        return None
-
-    # Initialize both open and closed list
-    open_list = []
-    closed_list = []
-
-    # Add the start node
-    open_list.append(start_node)
-    counter = 0
-    # Loop until you find the end
-    while len(open_list) > 0:
-        if counter > 50:
+    def get_occupancy_version(self) -> int:
+        return self._occupancy_version
+
+    def get_unit_target_path(self, unit: Unit, target: Target, blocked_mask: int = 0) -> Optional[TargetPath]:
+        """
+        Same as get_target_path for an allied unit, but reuses the path the unit followed last tick when it still
+        leads to the same target: the remaining part is kept as is, or repaired around newly blocked tiles.
+        """
+        cached = self._unit_paths.get(unit.id)
+        path = None
+        if cached is not None and cached[0] == blocked_mask and cached[1].target.position == target.position:
+            # sur un chemin du tick précédent, seules les cases dont l'occupant a changé peuvent le bloquer
+            only_new_tiles = self._delta is not None and cached[2] == self._tick_count - 1
+            path = self.revalidate_path(unit.position, cached[1].path, blocked_mask, only_new_tiles)
+
+        target_path = TargetPath(target, path) if path else self.get_target_path(unit.position, target,
+                                                                                 blocked_mask=blocked_mask)
+        if target_path:
+            self._unit_paths[unit.id] = (blocked_mask, target_path, self._tick_count)
+        return target_path
+
+    def revalidate_path(self, origin: Position, path: List, blocked_mask: int,
+                        only_new_tiles: bool = False) -> Optional[List]:
+        try:
+            remaining = path[path.index((origin.x, origin.y)):]
+        except ValueError:
+            return None
+        if len(remaining) < 2:
+            return None
+        # remaining[0] est la case de l'unité, toujours nouvellement occupée quand elle a bougé
+        if only_new_tiles and self._delta.newly_occupied.isdisjoint(remaining[1:]):
+            return remaining
+
+        compiled_map = self._compiled_map
+        occupancy = self._occupancy
+        last_blocked = None
+        for i in range(1, len(remaining)):
+            if occupancy[compiled_map.index(*remaining[i])] & blocked_mask:
+                last_blocked = i
+        if last_blocked is None:
+            return remaining
+        if last_blocked == len(remaining) - 1:
             return None
-        counter += 1
-
-        # Get the current node
-        current_node = open_list[0]
-        current_index = 0
-        for index, item in enumerate(open_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
-
-        # Pop current off open list, add to closed list
-        open_list.pop(current_index)
-        closed_list.append(current_node)  # <-- change append to add
-
-        # Found the goal
-        if current_node == end_node:
-            path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
-            return path[::-1]  # Return reversed path
-
-        # Generate children
-        children = []
-        for new_position in [(0, -1), (0, 1), (-1, 0), (1, 0)]:  # Adjacent squares
-
-            # Get node position
-            node_position = (current_node.position[0] + new_position[0], current_node.position[1] + new_position[1])
-
-            # Make sure within range
-            if node_position[0] > (len(maze) - 1) or node_position[0] < 0 or node_position[1] > (
-                    len(maze[len(maze) - 1]) - 1) or node_position[1] < 0:
-                continue
-
-            if (tickmap.get_tile_type_at(Position(node_position[0], node_position[1])) == TileType.SPAWN
-                    and tickmap.get_tile_type_at(start) == TileType.SPAWN):
-                condition = ["SPAWN", "EMPTY"]
-            else:
-                condition = ["EMPTY"]
-
-            # Make sure walkable terrain
-            if maze[node_position[0]][node_position[1]] not in condition:
-                continue
-
-            # Create new node
-            new_node = Node(current_node, node_position)
-
-            # Append
-            children.append(new_node)
-
-        # Loop through children
-        for child in children:
 
-            # Child is on the closed list
-            if child in closed_list:  # <-- remove inner loop so continue takes you to the end of the outer loop
-                continue
+        # réparation locale : on rejoint la première case libre après le dernier obstacle
+        rejoin_indexes = {compiled_map.index(*remaining[i]): i for i in range(last_blocked + 1, len(remaining))}
+        came_from, reached = multi_target_search(compiled_map, origin, rejoin_indexes, occupancy, blocked_mask,
+                                                 max_expansions=self._max_expansions)
+        if not reached:
+            return None
+        rejoin_index = next(iter(reached))
+        return build_path(compiled_map, came_from, rejoin_index) + remaining[rejoin_indexes[rejoin_index] + 1:]
 
-            # Create the f, g, and h values
-            child.g = current_node.g + 1
-            child.h = ((child.position[0] - end_node.position[0]) ** 2) + (
-                    (child.position[1] - end_node.position[1]) ** 2)
-            child.f = child.g + child.h
+    def find_optimal_spawn(self, targets: List[Target]):
+        """Nearest spawn to targets[0] over every spawn tile, found with one reverse search from the target."""
+        spawns_by_index = {self._compiled_map.index_of(spawn): spawn for spawn in self._spawn_manager.find_all_spawn()}
+        path = nearest_source_path(self._compiled_map, spawns_by_index, targets[0].position, self._occupancy,
+                                   OCCUPIED_BY_ALLY | OCCUPIED_BY_ENEMY, self._max_expansions)
+        if path is None:
+            return None
+        spawn = spawns_by_index[self._compiled_map.index(*path[0])]
+        return {"spawn": spawn, "target_path": TargetPath(targets[0], path)}
 
-            # Child is already in the open list
-            for open_node in open_list:
-                if child == open_node and child.g > open_node.g:
-                    continue
+    def get_blacklist(self, blacklisted_positions):
+        if not blacklisted_positions:
+            return ()
+        return {self._compiled_map.index_of(position) for position in blacklisted_positions}
 
-            # Add the child to the open list
-            open_list.append(child)
+    @staticmethod
+    def simple_distance(position1, position2):
+        return sqrt(pow(abs(position1.x - position2.x) + 0.1, 2) + pow(abs(position1.y - position2.y) + 0.1, 2))
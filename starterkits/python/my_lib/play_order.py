@@ -0,0 +1,42 @@
+from array import array
+from typing import Dict, List
+
+
+class PlayOrderTable:
+    """
+    teamPlayOrderings compiled once per game into a dense ticks x teams array of ranks (0 plays first), teams being
+    numbered by get_team_index.
+
+    A tick missing from the orderings uses the last known ordering before it (the first one before the first known
+    tick), and a team missing from an ordering plays after every listed team.
+    """
+
+    def __init__(self, play_orderings: Dict[str, List[str]], team_ids: List[str]):
+        self.team_indexes: Dict[str, int] = {}
+        for team_id in list(team_ids) + [team_id for ordering in play_orderings.values() for team_id in ordering]:
+            self.team_indexes.setdefault(team_id, len(self.team_indexes))
+        self.team_count = len(self.team_indexes)
+
+        orderings = {int(tick): ordering for tick, ordering in play_orderings.items()}
+        self.first_tick = min(orderings, default=0)
+        self.tick_count = max(orderings, default=0) - self.first_tick + 1
+        self.ranks = array("i", [self.team_count]) * (self.tick_count * self.team_count)
+        ordering = orderings.get(self.first_tick, [])
+        for row in range(self.tick_count):
+            ordering = orderings.get(self.first_tick + row, ordering)
+            offset = row * self.team_count
+            for rank, team_id in enumerate(ordering):
+                self.ranks[offset + self.team_indexes[team_id]] = rank
+
+    def get_team_index(self, team_id: str) -> int:
+        return self.team_indexes[team_id]
+
+    def get_rank_by_index(self, tick: int, team_index: int) -> int:
+        row = min(max(tick - self.first_tick, 0), self.tick_count - 1)
+        return self.ranks[row * self.team_count + team_index]
+
+    def get_rank(self, tick: int, team_id: str) -> int:
+        team_index = self.team_indexes.get(team_id)
+        if team_index is None:
+            return self.team_count
+        return self.get_rank_by_index(tick, team_index)
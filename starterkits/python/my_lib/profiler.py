@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+# chemin du fichier où écrire les histogrammes à la fin de la partie, le profilage est désactivé sans lui
+PROFILE_PATH_ENV = "BOT_PROFILE"
+
+# 2 ** SUB_BUCKET_BITS valeurs exactes, puis autant de sous-intervalles par puissance de deux (précision ~1.6%)
+SUB_BUCKET_BITS = 7
+PERCENTILES = (50, 90, 99, 99.9, 100)
+
+_DISABLED_PHASE = nullcontext()
+
+
+class Histogram:
+    """
+    Log-linear histogram of non negative integers, in the spirit of HdrHistogram: values below 2 ** SUB_BUCKET_BITS
+    are kept exactly, larger values fall in buckets whose width is a fixed fraction of the value.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def bucket_shift(value: int) -> int:
+        return max(0, value.bit_length() - SUB_BUCKET_BITS)
+
+    def record(self, value: int):
+        value = max(0, int(value))
+        shift = self.bucket_shift(value)
+        lower = (value >> shift) << shift
+        self.counts[lower] = self.counts.get(lower, 0) + 1
+        self.total_count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> int:
+        """Upper bound of the bucket holding the given percentile, 0 when empty."""
+        if not self.total_count:
+            return 0
+        wanted = max(1, round(self.total_count * percentile / 100))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= wanted:
+                return min(self.max, lower + (1 << self.bucket_shift(lower)) - 1)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.total_count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.total_count if self.total_count else 0,
+            "percentiles": {str(percentile): self.percentile(percentile) for percentile in PERCENTILES},
+            "buckets": [[lower, self.counts[lower]] for lower in sorted(self.counts)],
+        }
+
+
+class Profiler:
+    """
+    Timings of the tick phases (in microseconds) and per tick counters, kept as histograms for the whole game.
+
+    Every method returns immediately when the profiler is disabled, so the instrumentation can stay in the code.
+    """
+
+    def __init__(self, enabled: bool = False, path: Optional[str] = None):
+        self.enabled = enabled
+        self.path = path
+        self.histograms: Dict[str, Histogram] = {}
+        self._tick_counters: Dict[str, int] = {}
+
+    def phase(self, name: str):
+        """Context manager recording the time spent in its block under name."""
+        if not self.enabled:
+            return _DISABLED_PHASE
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_duration(name, time.perf_counter() - start)
+
+    def record_duration(self, name: str, seconds: float):
+        if self.enabled:
+            self.record(name, int(seconds * 1_000_000))
+
+    def record(self, name: str, value: int):
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(value)
+
+    def count(self, name: str, amount: int = 1):
+        """Adds to a per tick counter, recorded as one histogram value by end_tick."""
+        if self.enabled:
+            self._tick_counters[name] = self._tick_counters.get(name, 0) + amount
+
+    def end_tick(self):
+        if self.enabled:
+            for name, value in self._tick_counters.items():
+                self.record(f"{name}_per_tick", value)
+            self._tick_counters = {}
+
+    def reset(self):
+        self.histograms = {}
+        self._tick_counters = {}
+
+    def dump(self, path: Optional[str] = None):
+        """Writes every histogram as JSON, durations being in microseconds."""
+        path = path or self.path
+        if not self.enabled or not path:
+            return
+        with open(path, "w") as file:
+            json.dump({name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}, file,
+                      indent=2)
+
+
+profiler = Profiler(enabled=bool(os.environ.get(PROFILE_PATH_ENV)), path=os.environ.get(PROFILE_PATH_ENV))
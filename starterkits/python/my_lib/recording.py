@@ -0,0 +1,29 @@
+import gzip
+import json
+from typing import List
+
+# chemin du fichier où enregistrer les messages reçus pendant la partie, rien n'est enregistré sans lui
+RECORD_PATH_ENV = "BOT_RECORD"
+
+
+class TickRecorder:
+    """Writes every raw tick message received during a game to a gzip compressed JSONL file, one message per line."""
+
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wt", compresslevel=5)
+
+    def write(self, message: str):
+        if "\n" in message:
+            message = json.dumps(json.loads(message))
+        self._file.write(message)
+        self._file.write("\n")
+
+    def close(self):
+        self._file.close()
+
+
+def read_messages(path: str) -> List[str]:
+    """Raw messages of a recording, gzip compressed when path ends with .gz."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as recording:
+        return [line for line in recording if line.strip()]
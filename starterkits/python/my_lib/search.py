@@ -0,0 +1,171 @@
+from heapq import heappop, heappush
+from typing import Dict, List, Optional, Tuple
+
+from game_message import Position
+from my_lib.compiled_map import CompiledMap, WALL
+from my_lib.profiler import profiler
+
+
+def build_path(compiled_map: CompiledMap, came_from, end: int) -> List[Tuple[int, int]]:
+    path = []
+    current = end
+    while current is not None:
+        path.append(compiled_map.coordinates_of(current))
+        current = came_from[current]
+    return path[::-1]
+
+
+def astar(compiled_map: CompiledMap, start: Position, end: Position, occupancy: Optional[bytearray] = None,
+          blocked_mask: int = 0, blacklist=(), max_expansions: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+    """
+    Returns a list of tuples as a path from the given start to the given end, both included.
+
+    Spawn tiles are only walkable when the search starts from a spawn. A tile is also blocked when its occupancy
+    flags match blocked_mask or when its index is in blacklist. Returns None when the end is the start, is
+    unreachable, or when more than max_expansions nodes were expanded (no limit when None).
+    """
+    start_index = compiled_map.index_of(start)
+    end_index = compiled_map.index_of(end)
+    if start_index is None or end_index is None or start_index == end_index:
+        return None
+
+    neighbours = compiled_map.walkable_neighbours(start_index)
+    if occupancy is None or not blocked_mask:
+        occupancy = compiled_map.tiles
+        blocked_mask = 0
+    stride = compiled_map.stride
+    end_x, end_y = divmod(end_index, stride)
+
+    came_from = {start_index: None}
+    g_score = {start_index: 0}
+    closed = set()
+    start_x, start_y = divmod(start_index, stride)
+    h = abs(start_x - end_x) + abs(start_y - end_y)
+    # (f, h, index) : à f égal on préfère le noeud le plus proche de la fin
+    open_heap = [(h, h, start_index)]
+    expansions = 0
+    try:
+        while open_heap:
+            _, _, current = heappop(open_heap)
+            if current in closed:
+                continue
+            if current == end_index:
+                return build_path(compiled_map, came_from, current)
+
+            if max_expansions is not None and expansions >= max_expansions:
+                return None
+            expansions += 1
+            closed.add(current)
+
+            child_g = g_score[current] + 1
+            for child in neighbours[current]:
+                if child in closed or occupancy[child] & blocked_mask or child in blacklist:
+                    continue
+                if child_g < g_score.get(child, child_g + 1):
+                    g_score[child] = child_g
+                    came_from[child] = current
+                    child_x, child_y = divmod(child, stride)
+                    h = abs(child_x - end_x) + abs(child_y - end_y)
+                    heappush(open_heap, (child_g + h, h, child))
+        return None
+    finally:
+        if profiler.enabled:
+            profiler.count("astar_calls")
+            profiler.count("astar_expansions", expansions)
+
+
+def multi_target_search(compiled_map: CompiledMap, start: Position, targets, occupancy: Optional[bytearray] = None,
+                        blocked_mask: int = 0, blacklist=(), settle_all: bool = False,
+                        max_expansions: Optional[int] = None) -> Tuple[Dict[int, Optional[int]], Dict[int, int]]:
+    """
+    Breadth first search from start toward many target indices at once, with the same walking rules as astar.
+
+    Stops as soon as the nearest target is reached, or once every reachable target is reached when settle_all is set.
+    Returns the came_from table (to give to build_path) and the number of steps to each reached target, nearest first.
+    """
+    start_index = compiled_map.index_of(start)
+    remaining = set(targets)
+    remaining.discard(start_index)
+    came_from = {start_index: None}
+    reached = {}
+    if start_index is None or not remaining:
+        return came_from, reached
+
+    neighbours = compiled_map.walkable_neighbours(start_index)
+    if occupancy is None or not blocked_mask:
+        occupancy = compiled_map.tiles
+        blocked_mask = 0
+
+    frontier = [start_index]
+    steps = 0
+    expansions = 0
+    try:
+        while frontier:
+            steps += 1
+            next_frontier = []
+            for current in frontier:
+                if max_expansions is not None and expansions >= max_expansions:
+                    return came_from, reached
+                expansions += 1
+                for child in neighbours[current]:
+                    if child in came_from or occupancy[child] & blocked_mask or child in blacklist:
+                        continue
+                    came_from[child] = current
+                    if child in remaining:
+                        reached[child] = steps
+                        remaining.discard(child)
+                        if not settle_all or not remaining:
+                            return came_from, reached
+                    next_frontier.append(child)
+            frontier = next_frontier
+        return came_from, reached
+    finally:
+        if profiler.enabled:
+            profiler.count("multi_target_search_calls")
+            profiler.count("multi_target_search_expansions", expansions)
+
+
+def nearest_source_path(compiled_map: CompiledMap, sources, end: Position, occupancy: Optional[bytearray] = None,
+                        blocked_mask: int = 0, max_expansions: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+    """
+    Reverse breadth first search from end toward many spawn indices at once.
+
+    Returns the shortest path from the nearest source to end, with the same walking rules as an astar started on that
+    source: spawns are walkable, and a source is never blocked by its own occupancy. Returns None if none is reachable.
+    """
+    end_index = compiled_map.index_of(end)
+    if end_index is None or compiled_map.tiles[end_index] == WALL:
+        return None
+    if occupancy is None or not blocked_mask:
+        occupancy = compiled_map.tiles
+        blocked_mask = 0
+    if occupancy[end_index] & blocked_mask:
+        return None
+
+    neighbours = compiled_map.neighbours
+    sources = set(sources)
+    sources.discard(end_index)
+    next_step = {end_index: None}
+    frontier = [end_index]
+    expansions = 0
+    while frontier:
+        next_frontier = []
+        for current in frontier:
+            if max_expansions is not None and expansions >= max_expansions:
+                return None
+            expansions += 1
+            for child in neighbours[current]:
+                if child in next_step:
+                    continue
+                if child in sources:
+                    path = [compiled_map.coordinates_of(child)]
+                    while current is not None:
+                        path.append(compiled_map.coordinates_of(current))
+                        current = next_step[current]
+                    return path
+                if occupancy[child] & blocked_mask:
+                    continue
+                next_step[child] = current
+                next_frontier.append(child)
+        frontier = next_frontier
+    return None
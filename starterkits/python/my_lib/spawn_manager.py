@@ -1,7 +1,7 @@
-from math import ceil
 from typing import List
 
-from game_message import Position, TileType
+from game_message import Position
+from my_lib.map_analysis import MapAnalysis
 
 
 class SpawnManager:
@@ -9,42 +9,9 @@ class SpawnManager:
       self._spawns = None
       self._tick_map = None
 
-   def init_tick(self, tick):
+   def init_tick(self, tick, map_analysis: MapAnalysis):
       self._tick_map = tick.map
-      if not self._spawns:
-         game_map = self._tick_map.tiles
-         spawns = []
-         for x in range(len(game_map)):
-            for y in range(len(game_map[x])):
-               if self._tick_map.get_tile_type_at(Position(x, y)) == TileType.SPAWN:
-                  try:
-                     if self._tick_map.get_tile_type_at(Position(x - 1, y)) == TileType.EMPTY:
-                        spawns.append(Position(x, y))
-                        continue
-                  except:
-                     pass
-
-                  try:
-                     if self._tick_map.get_tile_type_at(Position(x, y - 1)) == TileType.EMPTY:
-                        spawns.append(Position(x, y))
-                        continue
-                  except:
-                     pass
-
-                  try:
-                     if self._tick_map.get_tile_type_at(Position(x + 1, y)) == TileType.EMPTY:
-                        spawns.append(Position(x, y))
-                        continue
-                  except:
-                     pass
-
-                  try:
-                     if self._tick_map.get_tile_type_at(Position(x, y + 1)) == TileType.EMPTY:
-                        spawns.append(Position(x, y))
-                        continue
-                  except:
-                     pass
-            self._spawns = spawns[::ceil(len(spawns) / 10)] if len(spawns) > 10 else spawns
+      self._spawns = map_analysis.spawns
 
    def find_all_spawn(self) -> List[Position]:
       return self._spawns
@@ -1,26 +1,55 @@
-from typing import Optional, List
+import time
+from typing import Dict, List, Optional, Tuple
 
-from game_message import Unit, Position, Tick
+from game_message import Diamond, Unit, Position, Tick
+from my_lib.assignment import solve_assignment
 from my_lib.models import Target, TargetType, PrioritizedTarget, PrioritizedMode, PrioritizedUnit
 from my_lib.pathfinder_manager import PathFinderManager
+from my_lib.tick_ingestor import TickDelta
 from my_lib.unit_manager import UnitManager
 
 
 class TargetManager:
+    """
+    Besides the diamond targets of the tick, keeps a reservation table: a diamond is claimed by at most one allied
+    unit, and the claim is kept from tick to tick until the unit claims another diamond or releases it, the unit
+    holds a diamond, is gone or waits to spawn, or the diamond is taken, moved or gone.
+    """
+
     def __init__(self, unit_manager: UnitManager, pathfinder: PathFinderManager):
         self._unit_manager = unit_manager
         self._tick = None
-        self._targets = None
         self._diamond_targets = None
         self._pathfinder = pathfinder
+        self._diamonds_by_id: Dict[str, Diamond] = {}
+        self._diamond_id_by_tile: Dict[Position, str] = {}
+        # diamant -> (unité, cible) et unité -> diamant
+        self._reservations: Dict[str, Tuple[str, Target]] = {}
+        self._reserved_diamond_by_unit: Dict[str, str] = {}
+        self._assigned_targets: Dict[str, PrioritizedTarget] = {}
 
-    def init_tick(self, tick: Tick):
+    def init_tick(self, tick: Tick, delta: Optional[TickDelta] = None):
         self._tick = tick
-        self._targets = {unit: None for unit in self._unit_manager.get_allied_units()}
-        self._diamond_targets = None
+        if delta is None or delta.map_changed or delta.diamonds_changed():
+            self._diamond_targets = None
+            self._diamonds_by_id = {diamond.id: diamond for diamond in tick.map.diamonds}
+            self._diamond_id_by_tile = {diamond.position: diamond.id for diamond in tick.map.diamonds}
+        self.prune_reservations()
+        self._assigned_targets = {}
+
+    def prune_reservations(self):
+        allied_unit_ids = self._unit_manager.get_allied_unit_ids()
+        spawned_unit_ids = {unit.id for unit in self._unit_manager.get_spawned_allied_units()}
+        holder_ids = {unit.id for unit in self._unit_manager.get_allied_holders()}
+        for diamond_id, (unit_id, target) in list(self._reservations.items()):
+            diamond = self._diamonds_by_id.get(diamond_id)
+            # une unité morte en attente de spawn ne garde pas son diamant, get_optimal_spawn le réclame au besoin
+            if (unit_id not in spawned_unit_ids or unit_id in holder_ids or diamond is None
+                    or diamond.position != target.position or diamond.ownerId in allied_unit_ids):
+                self.release_diamond(diamond_id)
 
     def get_diamond_targets(self):
-        if not self._diamond_targets:
+        if self._diamond_targets is None:
             self._diamond_targets = [Target(TargetType.DIAMOND, diamond, diamond.position)
                                      for diamond in self._tick.map.diamonds if not diamond.ownerId
                                      or diamond.ownerId not in self._unit_manager.get_allied_unit_ids()]
@@ -33,14 +62,14 @@ class TargetManager:
     def get_prioritized_target(self, unit: PrioritizedUnit, target: Target) -> Optional[PrioritizedTarget]:
         value = target.source.points * target.source.summonLevel
         if unit.hasSpawned:
-            target_path = self._pathfinder.get_target_path(unit.position, target)
-            if not target_path:
+            distance = self._pathfinder.get_distance(unit.position, target.position)
+            if not distance:
                 return None
 
             if unit.mode == PrioritizedMode.LONG_RANGE:
-                value *= target_path.get_distance()
+                value *= distance
             elif unit.mode == PrioritizedMode.SHORT_RANGE:
-                value /= target_path.get_distance()
+                value /= distance
 
         return PrioritizedTarget(target.target_type, target.source, target.position, value)
 
@@ -53,17 +82,77 @@ class TargetManager:
         
         return sorted(targets, key=lambda t: t.value, reverse=True)
 
+    def assign_targets(self, deadline: Optional[float] = None):
+        """
+        Gives every free spawned allied unit a diamond, maximizing the sum of their get_prioritized_target values over
+        the whole team (Hungarian algorithm) instead of letting each unit take its best diamond in planning order.
+
+        The distances come from one distance field per diamond, shared by every unit. Each assigned diamond is claimed
+        for its unit, replacing the claim the unit had; diamonds claimed by other units are left out.
+
+        Diamonds are scored one at a time until deadline (a time.monotonic() value): only the diamonds scored by then
+        are assigned, and the units left without one keep their claim and pick their diamond greedily when planned.
+        """
+        units = [unit for unit in self._unit_manager.get_spawned_allied_units() if not unit.hasDiamond]
+        if not units:
+            return
+        # libres, ou réservés par une des unités assignées
+        claimable_by = {unit.id for unit in units} | {None}
+        targets = []
+        columns = []
+        for target in self.get_diamond_targets():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if self.get_reserving_unit_id(target.position) in claimable_by:
+                targets.append(target)
+                # un champ de distance par diamant, calculé ici au premier appel
+                columns.append([self.get_prioritized_target(unit, target) for unit in units])
+        if not targets:
+            return
+        prioritized_targets = [list(row) for row in zip(*columns)]
+        costs = [[-prioritized.value if prioritized else None for prioritized in row] for row in prioritized_targets]
+
+        scored_positions = {target.position for target in targets}
+        for unit in units:
+            target = self.get_target_of_unit(unit)
+            if target is not None and target.position in scored_positions:
+                self.release_unit(unit)
+        for unit, row, column in zip(units, prioritized_targets, solve_assignment(costs)):
+            if column is not None and self.set_target_of_unit(unit, row[column]):
+                self._assigned_targets[unit.id] = row[column]
+
+    def get_assigned_target(self, unit: Unit) -> Optional[PrioritizedTarget]:
+        return self._assigned_targets.get(unit.id)
+
     def get_target_of_unit(self, unit: Unit) -> Optional[Target]:
-        return self._targets[unit]
+        diamond_id = self._reserved_diamond_by_unit.get(unit.id)
+        return self._reservations[diamond_id][1] if diamond_id is not None else None
 
     def unit_has_target(self, unit: Unit) -> bool:
-        return self._targets[unit] is not None
+        return unit.id in self._reserved_diamond_by_unit
 
     def set_target_of_unit(self, unit: Unit, target: Target) -> bool:
-        if self.target_is_available_for_unit(unit, target.source.position):
-            self._targets[unit] = target
-            return True
-        return False
+        """Claims the diamond of target for unit, releasing its previous claim. False if another unit claimed it."""
+        diamond_id = self._diamond_id_by_tile.get(target.source.position)
+        if diamond_id is None or not self.target_is_available_for_unit(unit, target.source.position):
+            return False
+        self.release_unit(unit)
+        self._reservations[diamond_id] = (unit.id, target)
+        self._reserved_diamond_by_unit[unit.id] = diamond_id
+        return True
+
+    def release_unit(self, unit: Unit):
+        diamond_id = self._reserved_diamond_by_unit.get(unit.id)
+        if diamond_id is not None:
+            self.release_diamond(diamond_id)
+
+    def release_diamond(self, diamond_id: str):
+        unit_id, _ = self._reservations.pop(diamond_id)
+        del self._reserved_diamond_by_unit[unit_id]
+
+    def get_reserving_unit_id(self, position: Position) -> Optional[str]:
+        reservation = self._reservations.get(self._diamond_id_by_tile.get(position))
+        return reservation[0] if reservation is not None else None
 
     def target_is_available_for_unit(self, unit: Unit, position: Position) -> bool:
         if position is None:
@@ -71,9 +160,5 @@ class TargetManager:
         if unit is None:
             return False
 
-        for curr_unit in self._unit_manager.get_allied_units():
-            if curr_unit != unit:
-                curr_target = self.get_target_of_unit(curr_unit)
-                if curr_target is not None and curr_target.source.position == position:
-                    return False
-        return True
+        reserving_unit_id = self.get_reserving_unit_id(position)
+        return reserving_unit_id is None or reserving_unit_id == unit.id
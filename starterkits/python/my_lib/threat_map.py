@@ -0,0 +1,111 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from game_message import Position
+from my_lib.compiled_map import CompiledMap
+
+UNREACHABLE = -1
+# un ennemi sur un spawn n'est compté que pour position_is_dangerous, qui ne regarde pas au-delà de 2 cases
+SPAWN_THREAT_RADIUS = 2
+
+
+class ThreatMap:
+    """
+    Distance from every empty tile to the nearest enemy, computed once per tick with a multi-source breadth first search.
+
+    Each tile also keeps the position of that nearest enemy and the best play-order rank (lowest is first to play)
+    among the enemies at that distance, to answer "can they hit me first" without looking at each enemy.
+
+    Like the distance fields, distances and nearest enemies leave out enemies standing on a spawn tile. Those only
+    count in get_danger, up to SPAWN_THREAT_RADIUS moves away.
+    """
+
+    def __init__(self, compiled_map: CompiledMap, enemies: List[Tuple[Position, int]]):
+        """enemies: position and play-order rank of every spawned enemy."""
+        self._compiled_map = compiled_map
+        self.distances = array("i", [UNREACHABLE]) * compiled_map.size
+        self.ranks = array("i", [0]) * compiled_map.size
+        self.nearest = array("i", [UNREACHABLE]) * compiled_map.size
+        # case -> (distance, meilleur rang) des ennemis sur un spawn à SPAWN_THREAT_RADIUS cases au plus
+        self.spawn_threats: Dict[int, Tuple[int, int]] = {}
+
+        frontier = []
+        spawn_enemies = []
+        for position, rank in enemies:
+            index = compiled_map.index_of(position)
+            if index is None:
+                continue
+            if compiled_map.is_spawn(position):
+                spawn_enemies.append((index, rank))
+            elif self.distances[index] == UNREACHABLE:
+                self.distances[index] = 0
+                self.ranks[index] = rank
+                self.nearest[index] = index
+                frontier.append(index)
+            elif rank < self.ranks[index]:
+                self.ranks[index] = rank
+
+        # les ennemis ne peuvent pas revenir sur un spawn
+        neighbours = compiled_map.empty_neighbours
+        distances = self.distances
+        ranks = self.ranks
+        nearest = self.nearest
+        steps = 0
+        while frontier:
+            steps += 1
+            next_frontier = []
+            for current in frontier:
+                for child in neighbours[current]:
+                    if distances[child] == UNREACHABLE:
+                        distances[child] = steps
+                        ranks[child] = ranks[current]
+                        nearest[child] = nearest[current]
+                        next_frontier.append(child)
+                    elif distances[child] == steps and ranks[current] < ranks[child]:
+                        ranks[child] = ranks[current]
+            frontier = next_frontier
+
+        for index, rank in spawn_enemies:
+            self.add_spawn_threat(index, rank)
+
+    def add_spawn_threat(self, index: int, rank: int):
+        neighbours = self._compiled_map.empty_neighbours
+        frontier = [index]
+        seen = {index}
+        for steps in range(SPAWN_THREAT_RADIUS + 1):
+            next_frontier = []
+            for current in frontier:
+                threat = self.spawn_threats.get(current)
+                if threat is None or (steps, rank) < threat:
+                    self.spawn_threats[current] = (steps, rank)
+                if steps < SPAWN_THREAT_RADIUS:
+                    for child in neighbours[current]:
+                        if child not in seen:
+                            seen.add(child)
+                            next_frontier.append(child)
+            frontier = next_frontier
+
+    def get_distance(self, position: Position) -> Optional[int]:
+        """Number of moves for the nearest enemy to reach position, None if no enemy can reach it."""
+        index = self._compiled_map.index_of(position)
+        if index is None or self.distances[index] == UNREACHABLE:
+            return None
+        return self.distances[index]
+
+    def get_danger(self, position: Position) -> Tuple[Optional[int], int]:
+        """
+        Distance of the nearest enemy, those on a spawn included, and the best play-order rank among the enemies at
+        that distance. The distance is None if no enemy can reach position.
+        """
+        index = self._compiled_map.index_of(position)
+        danger = (None if self.distances[index] == UNREACHABLE else self.distances[index], self.ranks[index])
+        spawn_threat = self.spawn_threats.get(index)
+        if spawn_threat is not None and (danger[0] is None or spawn_threat < danger):
+            return spawn_threat
+        return danger
+
+    def get_nearest_enemy_position(self, position: Position) -> Optional[Position]:
+        index = self._compiled_map.index_of(position)
+        if index is None or self.nearest[index] == UNREACHABLE:
+            return None
+        return self._compiled_map.position_of(self.nearest[index])
@@ -0,0 +1,83 @@
+from dataclasses import dataclass, field
+from typing import Dict, Set, Tuple
+
+from game_message import Tick
+
+
+@dataclass
+class TickDelta:
+    """What changed since the previous tick, so the managers can update their caches instead of rebuilding them."""
+    map_changed: bool = True
+    play_orderings_changed: bool = True
+    moved_unit_ids: Set[str] = field(default_factory=set)  # nouvelle position, spawn ou disparition
+    changed_unit_ids: Set[str] = field(default_factory=set)  # diamant, invocation, ...
+    added_diamond_ids: Set[str] = field(default_factory=set)
+    removed_diamond_ids: Set[str] = field(default_factory=set)
+    changed_diamond_ids: Set[str] = field(default_factory=set)
+    newly_occupied: Set[Tuple[int, int]] = field(default_factory=set)  # nouvel occupant, ou occupant changé
+    vacated: Set[Tuple[int, int]] = field(default_factory=set)
+
+    def units_changed(self) -> bool:
+        return bool(self.moved_unit_ids or self.changed_unit_ids)
+
+    def diamonds_changed(self) -> bool:
+        return bool(self.added_diamond_ids or self.removed_diamond_ids or self.changed_diamond_ids)
+
+
+class TickIngestor:
+    """
+    Compares each tick with the previous one. The tiles are only compared (never re-derived) and, when they did not
+    change, the new tick shares the previous tiles list so everything built from it stays valid.
+    """
+
+    def __init__(self):
+        self._tiles = None
+        self._play_orderings = None
+        self._units: Dict[str, tuple] = {}
+        self._diamonds: Dict[str, tuple] = {}
+
+    def ingest(self, tick: Tick) -> TickDelta:
+        delta = TickDelta()
+
+        delta.map_changed = self._tiles is None or tick.map.tiles != self._tiles
+        if delta.map_changed:
+            self._tiles = tick.map.tiles
+            self._units = {}
+            self._diamonds = {}
+        else:
+            tick.map.tiles = self._tiles
+
+        delta.play_orderings_changed = tick.teamPlayOrderings != self._play_orderings
+        self._play_orderings = tick.teamPlayOrderings
+
+        units = {}
+        for team in tick.teams:
+            for unit in team.units:
+                position = (unit.position.x, unit.position.y) if unit.hasSpawned and unit.position else None
+                units[unit.id] = (position, unit.hasDiamond, unit.diamondId, unit.isSummoning)
+        for unit_id, state in units.items():
+            previous = self._units.get(unit_id)
+            if previous is None or previous[0] != state[0]:
+                delta.moved_unit_ids.add(unit_id)
+            elif previous != state:
+                delta.changed_unit_ids.add(unit_id)
+        delta.moved_unit_ids.update(unit_id for unit_id in self._units if unit_id not in units)
+        occupants = {state[0]: unit_id for unit_id, state in units.items() if state[0] is not None}
+        previous_occupants = {state[0]: unit_id for unit_id, state in self._units.items() if state[0] is not None}
+        delta.newly_occupied = {position for position, unit_id in occupants.items()
+                                if previous_occupants.get(position) != unit_id or unit_id in delta.changed_unit_ids}
+        delta.vacated = {position for position in previous_occupants if position not in occupants}
+        self._units = units
+
+        diamonds = {diamond.id: ((diamond.position.x, diamond.position.y), diamond.ownerId, diamond.summonLevel,
+                                 diamond.points) for diamond in tick.map.diamonds}
+        for diamond_id, state in diamonds.items():
+            previous = self._diamonds.get(diamond_id)
+            if previous is None:
+                delta.added_diamond_ids.add(diamond_id)
+            elif previous != state:
+                delta.changed_diamond_ids.add(diamond_id)
+        delta.removed_diamond_ids = {diamond_id for diamond_id in self._diamonds if diamond_id not in diamonds}
+        self._diamonds = diamonds
+
+        return delta
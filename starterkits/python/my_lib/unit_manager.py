@@ -1,19 +1,32 @@
-from typing import List
+from typing import Dict, List, Optional, Set
 
-from game_message import Tick, Unit
+from game_message import Tick, Unit, Position
 from my_lib.models import PrioritizedUnit, PrioritizedMode
 
 
 class UnitManager:
+    """
+    Units of the current tick, each one built once by init_tick and shared by every view.
+
+    Besides the views (allied, enemy, spawned, holders, per team), units can be found by id and by tile. Views keep
+    the order of the tick message, which is also the order given by get_unit_order.
+    """
+
     def __init__(self):
         self._team = None
-        self._units = None
-        self._spawned_allied_units = None
-        self._spawned_enemy_units = None
-        self._allied_units = None
-        self._enemy_units = None
-        self._allied_unit_ids = None
-        self._allied_unit_positions = None
+        self._units: List[PrioritizedUnit] = []
+        self._allied_units: List[PrioritizedUnit] = []
+        self._enemy_units: List[PrioritizedUnit] = []
+        self._spawned_allied_units: List[PrioritizedUnit] = []
+        self._spawned_enemy_units: List[PrioritizedUnit] = []
+        self._allied_holders: List[PrioritizedUnit] = []
+        self._enemy_holders: List[PrioritizedUnit] = []
+        self._units_by_team: Dict[str, List[PrioritizedUnit]] = {}
+        self._order_by_id: Dict[str, int] = {}
+        self._unit_by_tile: Dict[Position, PrioritizedUnit] = {}
+        self._allied_unit_ids: Set[str] = set()
+        self._allied_unit_positions: Set[Position] = set()
+        self._unit_positions: Set[Position] = set()
 
     def get_units(self) -> List[PrioritizedUnit]:
         return self._units
@@ -21,38 +34,76 @@ class UnitManager:
     def get_allied_units(self) -> List[PrioritizedUnit]:
         return self._allied_units
 
-    def get_spawned_allied_units(self):
-        if not self._spawned_allied_units:
-            self._spawned_allied_units = [unit for unit in self._allied_units if unit.hasSpawned]
+    def get_enemy_units(self) -> List[PrioritizedUnit]:
+        return self._enemy_units
+
+    def get_spawned_allied_units(self) -> List[PrioritizedUnit]:
         return self._spawned_allied_units
 
-    def get_spawned_enemy_units(self):
-        if not self._spawned_enemy_units:
-            self._spawned_enemy_units = [unit for unit in self._enemy_units if unit.hasSpawned]
+    def get_spawned_enemy_units(self) -> List[PrioritizedUnit]:
         return self._spawned_enemy_units
 
-    def get_allied_unit_ids(self):
-        if not self._allied_unit_ids:
-            self._allied_unit_ids = [unit.id for unit in self._allied_units]
+    def get_allied_holders(self) -> List[PrioritizedUnit]:
+        return self._allied_holders
+
+    def get_enemy_holders(self) -> List[PrioritizedUnit]:
+        return self._enemy_holders
+
+    def get_team_units(self, team_id: str) -> List[PrioritizedUnit]:
+        return self._units_by_team.get(team_id, [])
+
+    def get_allied_unit_ids(self) -> Set[str]:
         return self._allied_unit_ids
 
-    def get_allied_unit_positions(self):
-        if not self._allied_unit_positions:
-            self._allied_unit_positions = [unit.id for unit in self.get_spawned_allied_units()]
+    def get_allied_unit_positions(self) -> Set[Position]:
         return self._allied_unit_positions
 
+    def get_unit_positions(self) -> Set[Position]:
+        """Tiles holding a unit, of any team."""
+        return self._unit_positions
+
+    def get_unit(self, unit_id: str) -> Optional[PrioritizedUnit]:
+        order = self._order_by_id.get(unit_id)
+        return self._units[order] if order is not None else None
+
+    def get_unit_at(self, position: Position) -> Optional[PrioritizedUnit]:
+        # plusieurs unités peuvent partager une tuile de spawn, on garde alors la dernière
+        return self._unit_by_tile.get(position)
+
+    def get_unit_order(self, unit: Unit) -> int:
+        return self._order_by_id[unit.id]
+
     def init_tick(self, tick: Tick):
-        self._enemy_units = []
         self._units = []
+        self._allied_units = []
+        self._enemy_units = []
+        self._spawned_allied_units = []
+        self._spawned_enemy_units = []
+        self._allied_holders = []
+        self._enemy_holders = []
+        self._units_by_team = {}
+        self._order_by_id = {}
+        self._unit_by_tile = {}
         for team in tick.teams:
-            if team.id == tick.teamId:
+            is_allied = team.id == tick.teamId
+            if is_allied:
                 self._team = team
-                self._allied_units = [self.unit_to_prioritized_unit(unit) for unit in team.units]
-            else:
-                self._enemy_units.extend([self.unit_to_prioritized_unit(unit) for unit in team.units])
-            self._units.extend([self.unit_to_prioritized_unit(unit) for unit in team.units])
-        self._spawned_enemy_units = None
-        self._spawned_allied_units = None
+            team_units = self._units_by_team.setdefault(team.id, [])
+            for raw_unit in team.units:
+                unit = self.unit_to_prioritized_unit(raw_unit)
+                self._order_by_id[unit.id] = len(self._units)
+                self._units.append(unit)
+                team_units.append(unit)
+                (self._allied_units if is_allied else self._enemy_units).append(unit)
+                if unit.position is not None:
+                    self._unit_by_tile[unit.position] = unit
+                if unit.hasSpawned:
+                    (self._spawned_allied_units if is_allied else self._spawned_enemy_units).append(unit)
+                    if unit.hasDiamond:
+                        (self._allied_holders if is_allied else self._enemy_holders).append(unit)
+        self._allied_unit_ids = {unit.id for unit in self._allied_units}
+        self._allied_unit_positions = {unit.position for unit in self._spawned_allied_units}
+        self._unit_positions = set(self._unit_by_tile)
 
     @staticmethod
     def unit_to_prioritized_unit(unit: Unit, mode: PrioritizedMode = PrioritizedMode.SHORT_RANGE) -> PrioritizedUnit: